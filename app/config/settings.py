@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
+import importlib.util
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +92,144 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# Cached recipe API responses and their ETags are invalidated by bumping a
+# per-user version key in this cache. LocMemCache is per process, so writes
+# made by other workers or by management commands (import_recipes,
+# recover_recipe_images), and writes that bypass model signals
+# (QuerySet.update), are not seen until the version key expires after
+# RECIPE_API_CACHE_TIMEOUT. Set CACHE_BACKEND/CACHE_LOCATION to a shared
+# cache (memcached, redis) so that other processes' writes invalidate
+# immediately.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_API_CACHE_ALIAS = 'default'
+RECIPE_API_CACHE_TIMEOUT = 300
+
+
+# REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'user_create': '20/hour',
+        'login': '30/min',
+        'login_email': '20/min',
+        'recipe_image_upload': '60/hour',
+    },
+    # Number of reverse proxies in front of the app. Client addresses for
+    # throttling are taken from X-Forwarded-For only past this many proxies;
+    # with 0 the header is ignored and REMOTE_ADDR is used.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+
+# Throttling
+
+THROTTLE_CACHE_ALIAS = None
+THROTTLE_LOCAL_MAX_KEYS = 100000
+
+
+# Token authentication
+
+TOKEN_AUTHENTICATION_CLASS = 'user.authentication.CachingTokenAuthentication'
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TIMEOUT = 60
+TOKEN_AUTH_CACHE_ALIAS = None
+
+
+# Recipe image processing
+
+RECIPE_IMAGE_ASYNC = True
+RECIPE_IMAGE_WORKERS = 2
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_RENDITION_WIDTHS = (160, 480, 1024)
+RECIPE_IMAGE_RENDITION_FORMATS = ('jpeg', 'webp')
+# Seconds after which a pending upload is treated as lost by
+# the recover_recipe_images command
+RECIPE_IMAGE_STALE_AFTER = 3600
+
+
+# Recipe full-text search
+
+RECIPE_SEARCH_CONFIG = 'english'
+
+
+# Tag/Ingredient autocomplete
+
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_TRIE_CACHE_SIZE = 1000
+AUTOCOMPLETE_TRIE_CACHE_TIMEOUT = 300
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/2.1/topics/auth/passwords/
+
+TESTING = sys.argv[1:2] == ['test']
+
+PASSWORD_HASHER_CHOICES = {
+    'argon2': 'user.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'user.hashers.PBKDF2PasswordHasher',
+    'md5': 'django.contrib.auth.hashers.MD5PasswordHasher',
+}
+PASSWORD_HASHER = os.environ.get(
+    'PASSWORD_HASHER',
+    'argon2' if importlib.util.find_spec('argon2') else 'pbkdf2'
+)
+if TESTING:
+    PASSWORD_HASHER = 'md5'
+
+PASSWORD_HASHERS = list(dict.fromkeys([
+    PASSWORD_HASHER_CHOICES[PASSWORD_HASHER],
+    'user.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'user.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]))
+
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 120000)
+)
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 512)
+)
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.environ.get('PASSWORD_ARGON2_PARALLELISM', 2)
+)
+
+
+# Instrumentation
+
+# The Server-Timing header exposes query counts and timings to clients, so it
+# is only sent when enabled explicitly.
+SERVER_TIMING_HEADER = bool(int(os.environ.get('SERVER_TIMING_HEADER', 0)))
+# Client addresses allowed to read /metrics/. Behind reverse proxies the
+# address is taken from X-Forwarded-For according to NUM_PROXIES.
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+QUERY_BUDGET = None
+QUERY_BUDGET_RAISE = TESTING
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,49 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    '''有効期限付きの上限件数のあるLRUキャッシュ(プロセス内)
+    '''
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''有効期限内の値を返す。存在しない場合はNoneを返す
+        '''
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        '''値を登録し、上限件数を超えた場合は古いものから削除する
+        '''
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        '''値を削除する
+        '''
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        '''全ての値を削除する
+        '''
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'recipe_api'
+METRICS = (
+    ('requests_total', 'counter', 'Number of requests.'),
+    ('request_duration_seconds_total', 'counter',
+     'Total time spent handling requests.'),
+    ('db_queries_total', 'counter', 'Number of SQL queries.'),
+    ('db_duration_seconds_total', 'counter',
+     'Total time spent executing SQL queries.'),
+    ('serialize_duration_seconds_total', 'counter',
+     'Total time spent in serializers, excluding SQL queries.'),
+    ('render_duration_seconds_total', 'counter',
+     'Total time spent encoding response bodies.'),
+    ('response_bytes_total', 'counter', 'Total size of response bodies.'),
+    ('query_budget_exceeded_total', 'counter',
+     'Number of requests that exceeded the query budget.'),
+)
+
+
+class QueryBudgetExceeded(Exception):
+    '''リクエストのクエリ数が上限を超えた
+    '''
+
+
+class RequestMetrics:
+    '''1リクエストのクエリ数、SQL、serializer、renderの時間を記録する
+
+    connection.execute_wrapperに登録して、実行したクエリを数える。
+    '''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_duration = 0.0
+        self.serialize_duration = 0.0
+        self.render_started = None
+        self.render_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        '''クエリを実行し、件数と時間を記録する
+        '''
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_duration += time.perf_counter() - started
+
+    def timed_serialize(self, to_representation):
+        '''serializerの出力処理の時間を記録する関数を返す
+
+        出力処理中に実行されたSQL(遅延評価のquerysetや関連の取得)の時間は
+        dbに含め、serializeからは除く。
+        '''
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            db_duration = self.db_duration
+            try:
+                return to_representation(*args, **kwargs)
+            finally:
+                self.serialize_duration += (
+                    time.perf_counter() - started
+                    - (self.db_duration - db_duration)
+                )
+        return wrapper
+
+    def start_render(self):
+        '''renderの開始時刻を記録する
+        '''
+        self.render_started = time.perf_counter()
+
+    def end_render(self, response):
+        '''render(レスポンスのエンコード)の時間を記録する
+        '''
+        if self.render_started is not None:
+            self.render_duration += time.perf_counter() - self.render_started
+            self.render_started = None
+
+    def duration(self):
+        '''リクエスト開始からの経過時間を返す
+        '''
+        return time.perf_counter() - self.started
+
+    def server_timing(self, duration):
+        '''Server-Timingヘッダの値を返す
+
+        appはSQL、serializer、render以外(viewの処理など)の時間とする。
+        '''
+        app = max(
+            duration - self.db_duration - self.serialize_duration
+            - self.render_duration,
+            0
+        )
+        return ', '.join((
+            f'db;dur={self.db_duration * 1000:.2f};'
+            f'desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_duration * 1000:.2f}',
+            f'render;dur={self.render_duration * 1000:.2f}',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ))
+
+
+class MetricsRegistry:
+    '''view, メソッド, ステータス毎にリクエストの計測値を集計する(プロセス内)
+    '''
+
+    def __init__(self):
+        self._values = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def record(self, labels, metrics, duration, size, exceeded):
+        '''1リクエストの計測値を加算する
+        '''
+        with self._lock:
+            values = self._values[labels]
+            values['requests_total'] += 1
+            values['request_duration_seconds_total'] += duration
+            values['db_queries_total'] += metrics.queries
+            values['db_duration_seconds_total'] += metrics.db_duration
+            values['serialize_duration_seconds_total'] += \
+                metrics.serialize_duration
+            values['render_duration_seconds_total'] += \
+                metrics.render_duration
+            values['response_bytes_total'] += size
+            values['query_budget_exceeded_total'] += int(exceeded)
+
+    def clear(self):
+        '''集計値を削除する
+        '''
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        '''Prometheusのテキスト形式で集計値を返す
+        '''
+        with self._lock:
+            values = {
+                labels: dict(metrics)
+                for labels, metrics in self._values.items()
+            }
+
+        lines = []
+        for name, metric_type, description in METRICS:
+            metric = f'{METRIC_PREFIX}_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {metric_type}')
+            for (view, method, status), metrics in sorted(values.items()):
+                lines.append(
+                    f'{metric}{{view="{view}",method="{method}",'
+                    f'status="{status}"}} {metrics.get(name, 0):g}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def get_query_budget(request):
+    '''リクエストのviewのクエリ数の上限を返す(上限なしはNone)
+
+    viewクラスのquery_budgetを、なければQUERY_BUDGETを使用する。
+    '''
+    match = getattr(request, 'resolver_match', None)
+    view_class = getattr(getattr(match, 'func', None), 'cls', None)
+    return getattr(view_class, 'query_budget', settings.QUERY_BUDGET)
+
+
+class SerializerTimingMixin:
+    '''get_serializerで返すserializerの出力処理の時間を計測するviewのmixin
+    '''
+
+    def get_serializer(self, *args, **kwargs):
+        '''出力処理の時間を記録するserializerを返す
+        '''
+        serializer = super().get_serializer(*args, **kwargs)
+        metrics = getattr(self.request, 'metrics', None)
+        if metrics is not None:
+            serializer.to_representation = metrics.timed_serialize(
+                serializer.to_representation
+            )
+        return serializer
+
+
+class InstrumentationMiddleware:
+    '''リクエスト毎のクエリ数、SQL、serializer、renderの時間、
+    レスポンスサイズを計測するmiddleware
+
+    計測値はServer-Timingヘッダで返し、registryに集計する。クエリ数が
+    上限を超えた場合は警告を記録し、QUERY_BUDGET_RAISEが有効(テスト時)
+    であればQueryBudgetExceededを送出する。
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        request.metrics = metrics
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        duration = metrics.duration()
+
+        budget = get_query_budget(request)
+        exceeded = budget is not None and metrics.queries > budget
+        registry.record(
+            self.get_labels(request, response),
+            metrics,
+            duration,
+            self.get_size(response),
+            exceeded
+        )
+        if exceeded:
+            message = (
+                f'{request.method} {request.path} executed '
+                f'{metrics.queries} queries (budget: {budget})'
+            )
+            logger.warning(message)
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = metrics.server_timing(duration)
+        return response
+
+    def process_template_response(self, request, response):
+        '''render(レスポンスのエンコード)の時間を計測する
+        '''
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.start_render()
+            response.add_post_render_callback(metrics.end_render)
+        return response
+
+    def get_labels(self, request, response):
+        '''集計に使うview名、メソッド、ステータスを返す
+        '''
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        return (view, request.method, response.status_code)
+
+    def get_size(self, response):
+        '''レスポンスのサイズを返す(ストリーミングの場合は0)
+        '''
+        if response.streaming:
+            return 0
+        return len(response.content)
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe import export
+
+
+class Command(BaseCommand):
+    '''ユーザの全レシピをNDJSONまたはCSVで出力するdjangoコマンド
+    '''
+    help = 'Export all recipes of a user as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=sorted(export.RENDERERS),
+            default='ndjson'
+        )
+        parser.add_argument('--output', help='Output file (default: stdout)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=export.EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["email"]} does not exist.')
+
+        _, render = export.RENDERERS[options['file_format']]
+        rows = export.iter_recipe_rows(user, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.writelines(render(rows))
+        else:
+            for line in render(rows):
+                self.stdout.write(line, ending='')
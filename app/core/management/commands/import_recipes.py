@@ -0,0 +1,264 @@
+import csv
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.bulk import BULK_BATCH_SIZE, bulk_insert, bulk_insert_m2m
+from recipe.cache import bump_version
+from recipe.export import CSV_LIST_SEPARATOR
+
+
+def read_ndjson(lines):
+    '''NDJSONの各行を辞書として返す(JSONとして不正な行はNoneを返す)
+    '''
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def read_csv(lines):
+    '''ヘッダ付きCSVの各行を辞書として返す
+    '''
+    for row in csv.DictReader(lines):
+        for name in ('tags', 'ingredients'):
+            value = row.get(name) or ''
+            row[name] = value.split(CSV_LIST_SEPARATOR) if value else []
+        yield row
+
+
+READERS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+INTEGER_RANGE = BaseDatabaseOperations.integer_field_ranges['IntegerField']
+RELATED_MODELS = {
+    'tags': Tag,
+    'ingredients': Ingredient,
+}
+
+
+def clean_field(model, name, value):
+    '''モデルのフィールドの検証(最大長、桁数等)を行い、変換した値を返す
+    '''
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        raise ValueError(f'invalid {name}: {" ".join(e.messages)}')
+
+
+def parse_integer(value):
+    '''整数または整数の文字列を整数に変換する(小数、真偽値は不正とする)
+    '''
+    if isinstance(value, bool):
+        raise ValueError(f'{value!r} is not an integer')
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f'{value!r} is not an integer')
+        return int(value)
+    if isinstance(value, (int, str)):
+        return int(value)
+    raise ValueError(f'{value!r} is not an integer')
+
+
+def parse_names(record, field):
+    '''tag名, ingredient名のリストを検証し、空の名前を除いて返す
+    '''
+    names = record.get(field)
+    if names is None:
+        return []
+    if not isinstance(names, list) \
+            or not all(isinstance(name, str) for name in names):
+        raise ValueError(f'invalid {field}: must be a list of strings')
+    return [
+        clean_field(RELATED_MODELS[field], 'name', name.strip())
+        for name in names
+        if name.strip()
+    ]
+
+
+def parse_recipe(record):
+    '''レコードをモデルの定義に従って検証し、レシピの属性とtag名、
+    ingredient名を返す
+
+    priceはフィールドの小数点以下の桁数に丸め、空の名前は除く。
+    '''
+    if not isinstance(record, dict):
+        raise ValueError('invalid record')
+    if not isinstance(record.get('title'), str):
+        raise ValueError('invalid title: must be a string')
+    if not isinstance(record.get('link') or '', str):
+        raise ValueError('invalid link: must be a string')
+    price_places = Recipe._meta.get_field('price').decimal_places
+    try:
+        values = {
+            'title': record['title'],
+            'time_minutes': parse_integer(record['time_minutes']),
+            'price': Decimal(str(record['price'])).quantize(
+                Decimal(1).scaleb(-price_places)
+            ),
+            'link': record.get('link') or '',
+        }
+    except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+        raise ValueError(f'invalid recipe: {e!r}')
+    if not INTEGER_RANGE[0] <= values['time_minutes'] <= INTEGER_RANGE[1]:
+        raise ValueError('invalid time_minutes: out of range')
+
+    attrs = {
+        name: clean_field(Recipe, name, value)
+        for name, value in values.items()
+    }
+    names = {field: parse_names(record, field) for field in RELATED_MODELS}
+    return attrs, names
+
+
+class NameResolver:
+    '''(user, name)でtag, ingredientを重複排除し、idを解決する
+    '''
+
+    def __init__(self, model, user):
+        self.model = model
+        self.user = user
+        self.ids = dict(
+            model.objects.filter(user=user).values_list('name', 'id')
+        )
+
+    def resolve(self, names):
+        '''名前のリストに対応するオブジェクトを返し、未登録のものは登録する
+        '''
+        missing = [name for name in dict.fromkeys(names)
+                   if name not in self.ids]
+        created = bulk_insert(
+            self.model,
+            (self.model(user=self.user, name=name) for name in missing)
+        )
+        self.ids.update((obj.name, obj.pk) for obj in created)
+        return {name: self.model(pk=self.ids[name]) for name in names}
+
+
+class Command(BaseCommand):
+    '''NDJSON, CSVからユーザのレシピを一括登録するdjangoコマンド
+
+    登録後にユーザのバージョンを更新するが、稼働中のサーバのキャッシュを
+    無効化するにはCACHE_BACKENDに共有キャッシュ(memcached, redis等)を
+    指定する必要がある。プロセス毎のLocMemCacheでは、サーバはバージョンの
+    期限切れ(RECIPE_API_CACHE_TIMEOUT)まで古い一覧とETagを返す。
+    '''
+    help = 'Import recipes for a user from NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Input file (default: stdin)'
+        )
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=sorted(READERS),
+            default='ndjson'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["email"]} does not exist.')
+
+        if options['path'] == '-':
+            imported, skipped, elapsed = self.import_lines(
+                sys.stdin, user, options
+            )
+        else:
+            with open(options['path'], newline='') as f:
+                imported, skipped, elapsed = self.import_lines(
+                    f, user, options
+                )
+
+        bump_version(user.pk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes in {elapsed:.1f}s '
+            f'({imported / max(elapsed, 1e-6):.0f} recipes/s), '
+            f'skipped {skipped}.'
+        ))
+
+    def import_lines(self, lines, user, options):
+        '''入力をbatch毎に登録し、登録件数、スキップ件数、経過時間を返す
+        '''
+        records = self.parse_records(
+            READERS[options['file_format']](lines)
+        )
+        resolvers = {
+            'tags': NameResolver(Tag, user),
+            'ingredients': NameResolver(Ingredient, user),
+        }
+        self.skipped = 0
+        imported = 0
+        started = time.monotonic()
+        while True:
+            batch = list(islice(records, options['batch_size']))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.import_batch(batch, user, resolvers)
+            imported += len(batch)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{imported} recipes imported '
+                f'({imported / max(elapsed, 1e-6):.0f} recipes/s)'
+            )
+        return imported, self.skipped, time.monotonic() - started
+
+    def parse_records(self, records):
+        '''レコードを検証し、不正なものはスキップして報告する
+        '''
+        for number, record in enumerate(records, 1):
+            try:
+                yield parse_recipe(record)
+            except ValueError as e:
+                self.skipped += 1
+                self.stderr.write(f'Record {number}: {e}')
+
+    def import_batch(self, batch, user, resolvers):
+        '''1batch分のレシピとtag, ingredientの紐付けを登録する
+        '''
+        related_objs = {
+            name: resolver.resolve(
+                [n for _, names in batch for n in names[name]]
+            )
+            for name, resolver in resolvers.items()
+        }
+        recipes = bulk_insert(
+            Recipe,
+            (Recipe(user=user, **attrs) for attrs, _ in batch)
+        )
+        bulk_insert_m2m(recipes, [
+            {
+                name: [related_objs[name][n]
+                       for n in dict.fromkeys(names[name])]
+                for name in resolvers
+            }
+            for _, names in batch
+        ])
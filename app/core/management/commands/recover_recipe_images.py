@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.images import recover_stale_images
+
+
+class Command(BaseCommand):
+    '''処理が中断されたレシピ画像を回復するdjangoコマンド
+
+    ワーカの再起動等でpendingのまま残ったレシピを処理し直すか失敗とし、
+    参照されていない一時ファイルを削除する。
+    '''
+    help = 'Recover recipe images left pending by interrupted workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=settings.RECIPE_IMAGE_STALE_AFTER,
+            help='Seconds after which a pending image is treated as lost'
+        )
+        parser.add_argument(
+            '--reprocess',
+            action='store_true',
+            help='Process staged files again instead of marking them failed'
+        )
+
+    def handle(self, *args, **options):
+        reprocessed, failed, removed = recover_stale_images(
+            options['max_age'],
+            options['reprocess']
+        )
+        self.stdout.write(f'{reprocessed} images reprocessed')
+        self.stdout.write(f'{failed} images marked as failed')
+        self.stdout.write(f'{removed} staged files removed')
+        self.stdout.write(self.style.SUCCESS('Recipe images recovered!'))
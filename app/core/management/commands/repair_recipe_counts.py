@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipe.cache import bump_version
+from recipe.counts import recompute_recipe_counts
+
+
+class Command(BaseCommand):
+    '''tag, ingredientのrecipe_countを再計算するdjangoコマンド
+    '''
+    help = 'Recompute recipe_count of all tags and ingredients.'
+
+    def handle(self, *args, **options):
+        updated, user_ids = recompute_recipe_counts()
+        for user_id in user_ids:
+            bump_version(user_id)
+        for model, count in updated.items():
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {count} rows updated'
+            )
+        self.stdout.write(self.style.SUCCESS('Recipe counts repaired!'))
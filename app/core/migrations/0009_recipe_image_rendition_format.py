@@ -0,0 +1,22 @@
+# Generated by Django 2.1.15 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_image_processing'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipeimagerendition',
+            options={'ordering': ('width', 'format')},
+        ),
+        migrations.AddField(
+            model_name='recipeimagerendition',
+            name='format',
+            field=models.CharField(choices=[('jpeg', 'JPEG'), ('webp', 'WebP')], default='jpeg', max_length=10),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.1.15 on 2026-10-18 01:31
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    '''PostgreSQLの場合のみGINインデックスを作成し、既存レシピの検索用ベクトルを生成する
+    '''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_search_gin ON core_recipe '
+        'USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        "UPDATE core_recipe SET search_vector = "
+        "setweight(to_tsvector(%(config)s, core_recipe.title), 'A') || "
+        "setweight(to_tsvector(%(config)s, coalesce(("
+        "SELECT string_agg(core_tag.name, ' ') FROM core_tag "
+        "JOIN core_recipe_tags ON core_recipe_tags.tag_id = core_tag.id "
+        "WHERE core_recipe_tags.recipe_id = core_recipe.id), '')), 'B') || "
+        "setweight(to_tsvector(%(config)s, coalesce(("
+        "SELECT string_agg(core_ingredient.name, ' ') FROM core_ingredient "
+        "JOIN core_recipe_ingredients "
+        "ON core_recipe_ingredients.ingredient_id = core_ingredient.id "
+        "WHERE core_recipe_ingredients.recipe_id = core_recipe.id), '')), 'B')",
+        {'config': settings.RECIPE_SEARCH_CONFIG}
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX core_recipe_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
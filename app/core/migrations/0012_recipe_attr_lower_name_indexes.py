@@ -0,0 +1,37 @@
+# Generated by Django 2.1.15 on 2026-10-18 01:33
+
+from django.db import migrations
+
+
+TABLES = ('core_tag', 'core_ingredient')
+
+
+def create_lower_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX {table}_user_lower_name_idx ON {table} '
+            f'(user_id, lower(name) text_pattern_ops)'
+        )
+
+
+def drop_lower_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP INDEX {table}_user_lower_name_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_search_vector_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_lower_name_indexes,
+            drop_lower_name_indexes
+        ),
+    ]
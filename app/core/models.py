@@ -2,6 +2,7 @@ import uuid
 import os
 
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 from django.conf import settings
@@ -59,6 +60,19 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'name'],
+                name='core_tag_user_name_idx'
+            ),
+            models.Index(
+                fields=['user', 'recipe_count'],
+                name='core_tag_user_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -71,6 +85,19 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'name'],
+                name='core_ingr_user_name_idx'
+            ),
+            models.Index(
+                fields=['user', 'recipe_count'],
+                name='core_ingr_user_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -79,6 +106,15 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     '''レシピ
     '''
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -90,6 +126,60 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_status = models.CharField(
+        max_length=10,
+        blank=True,
+        choices=IMAGE_STATUS_CHOICES
+    )
+    image_staged = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'id'],
+                name='core_recipe_user_id_idx'
+            ),
+            models.Index(
+                fields=['user', 'price'],
+                name='core_recipe_user_price_idx'
+            ),
+            models.Index(
+                fields=['user', 'time_minutes'],
+                name='core_recipe_user_time_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class RecipeImageRendition(models.Model):
+    '''レシピ画像のサムネイル
+    '''
+    JPEG = 'jpeg'
+    WEBP = 'webp'
+    FORMAT_CHOICES = (
+        (JPEG, 'JPEG'),
+        (WEBP, 'WebP'),
+    )
+
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        related_name='image_renditions'
+    )
+    width = models.PositiveIntegerField()
+    format = models.CharField(
+        max_length=10,
+        choices=FORMAT_CHOICES,
+        default=JPEG
+    )
+    image = models.ImageField(upload_to=recipe_image_file_path)
+
+    class Meta:
+        ordering = ('width', 'format')
+
+    def __str__(self):
+        return f'{self.recipe} ({self.width}px {self.format})'
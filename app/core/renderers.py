@@ -0,0 +1,51 @@
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ORJSON_OPTIONS = 0
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+_encoder = encoders.JSONEncoder()
+
+
+def default(obj):
+    '''orjsonが変換できない値をDRFのJSONEncoderと同じ方法で変換する
+
+    Decimal, datetime, lazy文字列などがDRFのJSONRendererと同じ出力になる。
+    '''
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    '''orjsonがインストールされていればorjsonでJSONに変換するrenderer
+
+    出力はDRFのJSONRendererと同一となる。orjsonがない場合や、インデント
+    指定時などorjsonで同じ出力にできない場合はJSONRendererで変換する。
+    '''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        '''dataをJSONのバイト列に変換する
+        '''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or self.ensure_ascii or \
+                not self.compact or not self.strict:
+            return super().render(
+                data,
+                accepted_media_type,
+                renderer_context
+            )
+        if data is None:
+            return bytes()
+
+        ret = orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+        return ret.replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
@@ -1,12 +1,35 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import get_version
+from recipe.images import stage_upload
 
 
 class CommandTests(TestCase):
 
+    def use_temp_media_root(self):
+        '''MEDIA_ROOTをテスト毎の一時ディレクトリに置き換える
+        '''
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
     def test_wait_for_db_ready(self):
         '''DBが使用可能なとき
         '''
@@ -23,3 +46,230 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_export_recipes(self):
+        '''ユーザのレシピがNDJSONで出力されること
+        '''
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        Recipe.objects.create(
+            user=user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00
+        )
+        out = StringIO()
+
+        call_command('export_recipes', 'test@gmail.com', stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Pancakes'])
+
+    def test_export_recipes_unknown_user(self):
+        '''存在しないユーザの場合はエラーとなること
+        '''
+        with self.assertRaises(CommandError):
+            call_command('export_recipes', 'none@gmail.com')
+
+    def test_import_recipes(self):
+        '''NDJSONからレシピを登録し、tag, ingredientを名前で重複排除すること
+        '''
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        Tag.objects.create(user=user, name='Vegan')
+        records = [
+            {'title': 'Curry', 'time_minutes': 20, 'price': '7.00',
+             'tags': ['Vegan', 'Spicy'], 'ingredients': ['Rice']},
+            {'title': 'Salad', 'time_minutes': 5, 'price': '3.50',
+             'tags': ['Vegan'], 'ingredients': ['Rice', 'Rice']},
+            {'title': 'Broken'},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as f:
+            f.write('\n'.join(json.dumps(record) for record in records))
+            f.flush()
+            call_command(
+                'import_recipes', 'test@gmail.com', f.name,
+                batch_size=1, stdout=StringIO(), stderr=StringIO()
+            )
+
+        recipes = Recipe.objects.filter(user=user).order_by('id')
+        self.assertEqual([r.title for r in recipes], ['Curry', 'Salad'])
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['Spicy', 'Vegan']
+        )
+        self.assertEqual(
+            sorted(t.name for t in recipes[0].tags.all()),
+            ['Spicy', 'Vegan']
+        )
+        self.assertEqual(recipes[1].ingredients.count(), 1)
+
+    def test_import_recipes_skips_invalid_records(self):
+        '''モデルの定義に合わないレコードは報告してスキップすること
+        '''
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        valid = {'title': 'Curry', 'time_minutes': 20, 'price': '7.006'}
+        records = [
+            dict(valid, price='123456'),
+            dict(valid, price='NaN'),
+            dict(valid, title='x' * 256),
+            dict(valid, title=''),
+            dict(valid, time_minutes=10 ** 20),
+            dict(valid, tags=['x' * 256]),
+            dict(valid, tags='abc'),
+            dict(valid, ingredients=[1, 2]),
+            dict(valid, title=None),
+            dict(valid, time_minutes=5.9),
+            dict(valid, time_minutes=True),
+            dict(valid, tags=['', '  ', ' Spicy '], time_minutes=5.0),
+        ]
+        stderr = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as f:
+            f.write('\n'.join(json.dumps(record) for record in records))
+            f.flush()
+            call_command(
+                'import_recipes', 'test@gmail.com', f.name,
+                batch_size=1, stdout=StringIO(), stderr=stderr
+            )
+
+        self.assertEqual(len(stderr.getvalue().splitlines()), 11)
+        recipe = Recipe.objects.get(user=user)
+        self.assertEqual(str(recipe.price), '7.01')
+        self.assertEqual(recipe.time_minutes, 5)
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertEqual(
+            list(Tag.objects.values_list('name', flat=True)),
+            ['Spicy']
+        )
+
+    def test_import_recipes_csv(self):
+        '''export_recipesで出力したCSVを登録できること
+        '''
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name='Breakfast'))
+        user2 = get_user_model().objects.create_user('new@gmail.com', 'pass')
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            call_command(
+                'export_recipes', 'test@gmail.com',
+                file_format='csv', output=f.name
+            )
+            call_command(
+                'import_recipes', 'new@gmail.com', f.name,
+                file_format='csv', stdout=StringIO()
+            )
+
+        imported = Recipe.objects.get(user=user2)
+        self.assertEqual(imported.title, 'Pancakes')
+        self.assertEqual(
+            [tag.name for tag in imported.tags.all()],
+            ['Breakfast']
+        )
+
+    def test_repair_recipe_counts(self):
+        '''recipe_countが中間テーブルから再計算されること
+        '''
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00
+        )
+        recipe.tags.add(tag)
+        user2 = get_user_model().objects.create_user('new@gmail.com', 'pass')
+        Tag.objects.create(user=user2, name='Lunch')
+        Tag.objects.filter(pk=tag.pk).update(recipe_count=10)
+        versions = {u.pk: get_version(u.pk) for u in (user, user2)}
+        out = StringIO()
+
+        call_command('repair_recipe_counts', stdout=out)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertIn('tags: 1 rows updated', out.getvalue())
+        self.assertNotEqual(get_version(user.pk), versions[user.pk])
+        self.assertEqual(get_version(user2.pk), versions[user2.pk])
+
+    def test_recover_recipe_images(self):
+        '''pendingのまま残ったレシピを失敗とし、一時ファイルを削除すること
+        '''
+        self.use_temp_media_root()
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        staged = stage_upload(ContentFile(b'image'))
+        orphan = stage_upload(ContentFile(b'orphan'))
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00,
+            image_status=Recipe.IMAGE_PENDING,
+            image_staged=staged
+        )
+
+        call_command('recover_recipe_images', max_age=0, stdout=StringIO())
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(recipe.image_staged, '')
+        self.assertFalse(default_storage.exists(staged))
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_recover_recipe_images_keeps_recent(self):
+        '''指定時間内のpendingのレシピと一時ファイルは残すこと
+        '''
+        self.use_temp_media_root()
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        staged = stage_upload(ContentFile(b'image'))
+        self.addCleanup(default_storage.delete, staged)
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00,
+            image_status=Recipe.IMAGE_PENDING,
+            image_staged=staged
+        )
+
+        call_command('recover_recipe_images', stdout=StringIO())
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_PENDING)
+        self.assertTrue(default_storage.exists(staged))
+
+    def test_recover_recipe_images_reprocess(self):
+        '''reprocessを指定した場合は一時ファイルから処理し直すこと
+        '''
+        self.use_temp_media_root()
+        user = get_user_model().objects.create_user('test@gmail.com', 'pass')
+        with tempfile.TemporaryFile() as f:
+            Image.new('RGB', (10, 10)).save(f, format='JPEG')
+            f.seek(0)
+            staged = stage_upload(ContentFile(f.read()))
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00,
+            image_status=Recipe.IMAGE_PENDING,
+            image_staged=staged
+        )
+
+        call_command(
+            'recover_recipe_images',
+            max_age=0,
+            reprocess=True,
+            stdout=StringIO()
+        )
+
+        recipe.refresh_from_db()
+        for rendition in recipe.image_renditions.all():
+            rendition.image.delete()
+        recipe.image.delete()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        self.assertFalse(default_storage.exists(staged))
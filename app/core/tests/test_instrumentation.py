@@ -0,0 +1,167 @@
+import re
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.instrumentation import QueryBudgetExceeded, RequestMetrics, \
+    registry
+from core.models import Recipe
+from recipe.views import RecipeViewSet
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+ME_URL = reverse('user:me')
+METRICS_URL = reverse('metrics')
+
+
+class InstrumentationMiddlewareTests(TestCase):
+    '''リクエストの計測middlewareのテスト
+    '''
+
+    def setUp(self):
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00
+        )
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        '''Server-Timingヘッダでクエリ数と各処理の時間を返すこと
+        '''
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(RECIPES_URL, {'nocache': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        timing = res['Server-Timing']
+        self.assertIn(f'desc="{len(context)} queries"', timing)
+        for name in ('db', 'serialize', 'render', 'app', 'total'):
+            self.assertRegex(timing, rf'\b{name};dur=\d+\.\d\d')
+
+    def test_server_timing_header_disabled_by_default(self):
+        '''設定で有効にしない限りServer-Timingヘッダを返さないこと
+        '''
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', res)
+
+    def test_serializer_time_excludes_sql(self):
+        '''serializerの時間を計測し、出力処理中のSQLの時間は除くこと
+        '''
+        metrics = RequestMetrics()
+
+        def to_representation():
+            time.sleep(0.05)
+            metrics.db_duration += 0.05
+            return 'data'
+
+        self.assertEqual(metrics.timed_serialize(to_representation)(), 'data')
+        self.assertGreaterEqual(metrics.serialize_duration, 0)
+        self.assertLess(metrics.serialize_duration, 0.05)
+
+        self.client.get(RECIPES_URL)
+        duration = re.search(
+            r'recipe_api_serialize_duration_seconds_total\{'
+            r'view="recipe:recipe-list",method="GET",status="200"\} (\S+)',
+            registry.render()
+        )
+        self.assertGreater(float(duration.group(1)), 0)
+
+    def test_user_view_serializer_time(self):
+        '''ユーザのviewでもserializerの時間を計測すること
+        '''
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        duration = re.search(
+            r'recipe_api_serialize_duration_seconds_total\{'
+            r'view="user:me",method="GET",status="200"\} (\S+)',
+            registry.render()
+        )
+        self.assertGreater(float(duration.group(1)), 0)
+
+    def test_metrics_endpoint(self):
+        '''view毎の集計値をPrometheusのテキスト形式で返すこと
+        '''
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        labels = 'view="recipe:recipe-list",method="GET",status="200"'
+        self.assertIn(f'recipe_api_requests_total{{{labels}}} 2', body)
+        size = re.search(
+            rf'recipe_api_response_bytes_total{{{labels}}} (\d+)',
+            body
+        )
+        self.assertGreater(int(size.group(1)), 0)
+        self.assertIn('# TYPE recipe_api_db_queries_total counter', body)
+
+    def test_metrics_endpoint_restricted(self):
+        '''許可されていないアドレスからは計測値を取得できないこと
+        '''
+        res = self.client.get(METRICS_URL, REMOTE_ADDR='203.0.113.1')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_endpoint_behind_proxy(self):
+        '''リバースプロキシ経由ではプロキシが付与したアドレスで判定すること
+        '''
+        rest_framework = dict(settings.REST_FRAMEWORK, NUM_PROXIES=1)
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            res = self.client.get(
+                METRICS_URL,
+                HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.1'
+            )
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+            res = self.client.get(
+                METRICS_URL,
+                HTTP_X_FORWARDED_FOR='203.0.113.1, 127.0.0.1'
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(QUERY_BUDGET=1)
+    def test_query_budget_exceeded_in_tests(self):
+        '''テスト時はクエリ数が上限を超えたリクエストでエラーとなること
+        '''
+        with self.assertRaises(QueryBudgetExceeded), \
+                self.assertLogs('core.instrumentation', 'WARNING'):
+            self.client.get(RECIPES_URL)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_view_query_budget_exceeded(self):
+        '''viewのquery_budgetを超えた場合は警告を記録して集計すること
+        '''
+        with patch.object(RecipeViewSet, 'query_budget', 1, create=True), \
+                self.assertLogs('core.instrumentation', 'WARNING'):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            'recipe_api_query_budget_exceeded_total{'
+            'view="recipe:recipe-list",method="GET",status="200"} 1',
+            registry.render()
+        )
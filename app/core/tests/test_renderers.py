@@ -0,0 +1,90 @@
+import datetime
+import io
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+PAYLOAD = {
+    'id': 1,
+    'title': 'Crème brûlée\u2028\u2029',
+    'price': Decimal('5.50'),
+    'time_minutes': 10,
+    'tags': [{'id': 1, 'name': '朝食'}],
+    'created': timezone.make_aware(datetime.datetime(2020, 1, 2, 3, 4, 5)),
+    'ratio': 0.5,
+    'link': None,
+    1: True,
+}
+
+
+class FastJSONRendererTests(TestCase):
+    '''FastJSONRendererのテスト
+    '''
+
+    def test_same_output_as_json_renderer(self):
+        '''DRFのJSONRendererと同一の出力となること
+        '''
+        self.assertEqual(
+            FastJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD)
+        )
+
+    def test_indent_same_output_as_json_renderer(self):
+        '''インデント指定時もDRFのJSONRendererと同一の出力となること
+        '''
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type)
+        )
+
+    def test_render_without_orjson(self):
+        '''orjsonがない場合もJSONに変換できること
+        '''
+        with patch.object(renderers, 'orjson', None):
+            self.assertEqual(
+                FastJSONRenderer().render(PAYLOAD),
+                JSONRenderer().render(PAYLOAD)
+            )
+
+    @skipIf(renderers.orjson is None, 'orjson is not installed')
+    def test_render_with_orjson(self):
+        '''orjsonがある場合はorjsonで変換すること
+        '''
+        with patch.object(renderers.orjson, 'dumps',
+                          wraps=renderers.orjson.dumps) as dumps:
+            FastJSONRenderer().render(PAYLOAD)
+        dumps.assert_called_once()
+
+
+class FastJSONParserTests(TestCase):
+    '''FastJSONParserのテスト
+    '''
+
+    def test_same_result_as_json_parser(self):
+        '''DRFのJSONParserと同じ結果となること
+        '''
+        content = '{"title": "朝食", "price": 5.5, "tags": [1, 2]}'.encode()
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(content)),
+            JSONParser().parse(io.BytesIO(content))
+        )
+
+    def test_invalid_json(self):
+        '''不正なJSONはParseErrorとなること
+        '''
+        for content in (b'{"title": ', b'{"price": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(content))
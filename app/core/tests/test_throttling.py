@@ -0,0 +1,206 @@
+import base64
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.throttling import CacheCounterStore, LocalCounterStore, \
+    SlidingWindowRateThrottle, local_store
+
+
+CREATE_USER_URL = reverse('user:create')
+TOKEN_URL = reverse('user:token')
+RATES = {
+    'user_create': '2/hour',
+    'login': '3/min',
+    'login_email': '2/min',
+    'recipe_image_upload': '1/hour',
+}
+
+
+class CounterStoreTests(TestCase):
+    '''リクエスト数のストアのテスト
+    '''
+
+    def setUp(self):
+        cache.clear()
+
+    def test_local_store_windows(self):
+        '''現在と1つ前のウィンドウの数を返すこと
+        '''
+        store = LocalCounterStore(max_size=10)
+        store.incr('key', 5, 120)
+        store.incr('key', 5, 120)
+
+        self.assertEqual(store.get_counts('key', 5), (0, 2))
+        self.assertEqual(store.get_counts('key', 6), (2, 0))
+        self.assertEqual(store.get_counts('key', 7), (0, 0))
+
+        store.incr('key', 6, 120)
+        self.assertEqual(store.get_counts('key', 6), (2, 1))
+
+    def test_local_store_max_size(self):
+        '''上限件数を超えた場合は古いキーから削除すること
+        '''
+        store = LocalCounterStore(max_size=2)
+        for key in ('a', 'b', 'c'):
+            store.incr(key, 1, 120)
+
+        self.assertEqual(store.get_counts('a', 1), (0, 0))
+        self.assertEqual(store.get_counts('c', 1), (0, 1))
+
+    def test_cache_store_windows(self):
+        '''キャッシュのストアも現在と1つ前のウィンドウの数を返すこと
+        '''
+        store = CacheCounterStore(cache)
+        store.incr('key', 5, 120)
+        store.incr('key', 6, 120)
+        store.incr('key', 6, 120)
+
+        self.assertEqual(store.get_counts('key', 6), (1, 2))
+        self.assertEqual(
+            CacheCounterStore(cache).get_counts('key', 7),
+            (2, 0)
+        )
+
+
+@patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES', RATES)
+class ThrottleApiTests(TestCase):
+    '''認証、アップロードAPIの頻度制限のテスト
+    '''
+
+    def setUp(self):
+        local_store.clear()
+        self.addCleanup(local_store.clear)
+        self.client = APIClient()
+        self.payload = {
+            'email': 'test@gmail.com',
+            'password': 'testpassword',
+        }
+        self.user = get_user_model().objects.create_user(**self.payload)
+
+    def test_login_throttled_before_authentication(self):
+        '''上限を超えたログインは認証(パスワードのハッシュ)前に拒否されること
+        '''
+        with patch('user.serializers.authenticate',
+                   return_value=self.user) as authenticate:
+            for i in range(3):
+                res = self.client.post(
+                    TOKEN_URL,
+                    dict(self.payload, email=f'user{i}@gmail.com')
+                )
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        self.assertEqual(authenticate.call_count, 3)
+
+    def test_login_throttled_with_basic_auth_header(self):
+        '''Basic認証のヘッダがあってもパスワードを検証せずに制限されること
+        '''
+        credentials = base64.b64encode(b'test@gmail.com:wrong').decode()
+        with patch('user.serializers.authenticate', return_value=self.user), \
+                patch('django.contrib.auth.base_user.check_password',
+                      return_value=False) as check_password:
+            for i in range(4):
+                res = self.client.post(
+                    TOKEN_URL,
+                    dict(self.payload, email=f'user{i}@gmail.com'),
+                    HTTP_AUTHORIZATION=f'Basic {credentials}'
+                )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        check_password.assert_not_called()
+
+    def test_login_throttled_per_email(self):
+        '''IPアドレスが異なっても同じメールアドレスへの試行は制限されること
+        '''
+        for i in range(2):
+            res = self.client.post(
+                TOKEN_URL,
+                self.payload,
+                REMOTE_ADDR=f'10.0.0.{i}'
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(
+            TOKEN_URL,
+            dict(self.payload, email=' TEST@gmail.com'),
+            REMOTE_ADDR='10.0.0.9'
+        )
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_create_user_throttled(self):
+        '''ユーザ作成はIPアドレス毎に制限されること
+        '''
+        for i in range(2):
+            res = self.client.post(CREATE_USER_URL, {
+                'email': f'new{i}@gmail.com',
+                'password': 'testpassword',
+                'name': 'Test',
+            })
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(CREATE_USER_URL, {
+            'email': 'new9@gmail.com',
+            'password': 'testpassword',
+            'name': 'Test',
+        })
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(
+            get_user_model().objects.filter(email='new9@gmail.com').exists()
+        )
+
+    def test_create_user_throttled_with_spoofed_forwarded_for(self):
+        '''X-Forwarded-Forを変えても同じIPアドレスとして制限されること
+        '''
+        for i in range(3):
+            res = self.client.post(CREATE_USER_URL, {
+                'email': f'new{i}@gmail.com',
+                'password': 'testpassword',
+                'name': 'Test',
+            }, HTTP_X_FORWARDED_FOR=f'198.51.100.{i}')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @patch('recipe.images.schedule_processing')
+    def test_upload_image_throttled_before_processing(self, schedule):
+        '''上限を超えた画像アップロードは画像の処理前に拒否されること
+        '''
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00
+        )
+        url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+
+        res = self.client.post(url, {'image': 'notimage'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(url, {'image': 'notimage'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        schedule.assert_not_called()
+
+        res = self.client.get(reverse('recipe:recipe-list'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(THROTTLE_CACHE_ALIAS='default')
+    def test_shared_cache_store(self):
+        '''共有キャッシュを指定した場合はキャッシュで数えること
+        '''
+        cache.clear()
+        for i in range(2):
+            self.client.post(TOKEN_URL, self.payload)
+        local_store.clear()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -0,0 +1,204 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework import throttling
+
+
+THROTTLE_KEY = 'throttle:{key}:{window}'
+
+
+class LocalCounterStore:
+    '''ウィンドウ毎のリクエスト数をプロセス内で数えるストア
+
+    キー毎に現在と1つ前のウィンドウの数のみを保持し、上限件数を超えた
+    場合は古いキーから削除する。
+    '''
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _counts(self, key, window):
+        '''1つ前と現在のウィンドウの数を返す
+        '''
+        item = self._data.get(key)
+        if item is None:
+            return 0, 0
+        stored_window, current, previous = item
+        if stored_window == window:
+            return previous, current
+        if stored_window == window - 1:
+            return current, 0
+        return 0, 0
+
+    def get_counts(self, key, window):
+        '''1つ前と現在のウィンドウの数を返す
+        '''
+        with self._lock:
+            return self._counts(key, window)
+
+    def incr(self, key, window, timeout):
+        '''現在のウィンドウの数を1増やす
+        '''
+        with self._lock:
+            previous, current = self._counts(key, window)
+            self._data[key] = (window, current + 1, previous)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        '''全ての数を削除する
+        '''
+        with self._lock:
+            self._data.clear()
+
+
+class CacheCounterStore:
+    '''ウィンドウ毎のリクエスト数をキャッシュで数えるストア
+
+    memcached, redis等の共有キャッシュを指定すると複数のプロセス、
+    サーバで数を共有できる。
+    '''
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get_counts(self, key, window):
+        '''1つ前と現在のウィンドウの数を返す
+        '''
+        keys = [
+            THROTTLE_KEY.format(key=key, window=index)
+            for index in (window - 1, window)
+        ]
+        counts = self.cache.get_many(keys)
+        return counts.get(keys[0], 0), counts.get(keys[1], 0)
+
+    def incr(self, key, window, timeout):
+        '''現在のウィンドウの数を1増やす
+        '''
+        cache_key = THROTTLE_KEY.format(key=key, window=window)
+        self.cache.add(cache_key, 0, timeout)
+        try:
+            self.cache.incr(cache_key)
+        except ValueError:
+            self.cache.set(cache_key, 1, timeout)
+
+
+local_store = LocalCounterStore(settings.THROTTLE_LOCAL_MAX_KEYS)
+
+
+def get_counter_store():
+    '''設定に応じてリクエスト数のストアを返す
+
+    THROTTLE_CACHE_ALIASが指定されていればそのキャッシュを、
+    指定がなければプロセス内のストアを返す。
+    '''
+    alias = settings.THROTTLE_CACHE_ALIAS
+    return CacheCounterStore(caches[alias]) if alias else local_store
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    '''スライディングウィンドウ方式のthrottle
+
+    現在のウィンドウの数に、1つ前のウィンドウの数を経過時間で按分して
+    加えた値を上限と比較する。リクエスト毎の時刻は保持しないため、
+    キー毎に2つのカウンタのみで判定できる。
+    '''
+
+    def allow_request(self, request, view):
+        '''上限を超えていなければリクエストを数えて許可する
+        '''
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+        store = get_counter_store()
+        self.previous, self.current = store.get_counts(self.key, window)
+        if self.estimate(self.elapsed) >= self.num_requests:
+            return self.throttle_failure()
+
+        store.incr(self.key, window, self.duration * 2)
+        return self.throttle_success()
+
+    def estimate(self, elapsed):
+        '''経過時間に応じたリクエスト数の推定値を返す
+        '''
+        weight = 1 - elapsed / self.duration
+        return self.previous * weight + self.current
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        '''次のリクエストが許可されるまでの秒数を返す
+        '''
+        remaining = self.duration - self.elapsed
+        if self.current >= self.num_requests or not self.previous:
+            return remaining
+        allowed_elapsed = self.duration * (
+            1 - (self.num_requests - self.current) / self.previous
+        )
+        return min(max(allowed_elapsed - self.elapsed, 0), remaining)
+
+
+class ScopedSlidingWindowThrottle(SlidingWindowRateThrottle):
+    '''viewのthrottle_scopeに対応する頻度で制限するthrottle
+
+    認証済みの場合はユーザ毎、未認証の場合はIPアドレス毎に数える。
+    '''
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        pass
+
+    def allow_request(self, request, view):
+        '''viewのscopeの頻度を取得してから判定する
+        '''
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        '''ユーザまたはIPアドレスからキーを返す
+        '''
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LoginEmailRateThrottle(SlidingWindowRateThrottle):
+    '''ログインで指定されたメールアドレス毎に制限するthrottle
+
+    複数のIPアドレスから同じアカウントを狙う試行を制限する。
+    '''
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        '''メールアドレスからキーを返す(指定がない場合はNone)
+        '''
+        get = getattr(request.data, 'get', None)
+        email = get('email') if get else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': hashlib.sha256(
+                email.strip().lower().encode()
+            ).hexdigest(),
+        }
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from rest_framework.throttling import BaseThrottle
+
+from core.instrumentation import registry
+
+
+def metrics(request):
+    '''計測値をPrometheusのテキスト形式で返す
+
+    METRICS_ALLOWED_IPSに含まれるアドレスからのリクエストのみ許可する。
+    アドレスはthrottleと同じくNUM_PROXIESに従ってX-Forwarded-Forから取得する。
+    '''
+    if BaseThrottle().get_ident(request) not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Lower
+
+from core.cache import TTLCache
+from recipe.cache import get_version
+
+
+class NameTrie:
+    '''名前の前方一致検索用のtrie(小文字で比較する)
+    '''
+
+    def __init__(self, items=()):
+        self.root = {}
+        for item in items:
+            self.insert(item)
+
+    def insert(self, item):
+        '''{'id', 'name'}の辞書を登録する
+        '''
+        node = self.root
+        for char in item['name'].lower():
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(item)
+
+    def search(self, prefix, limit):
+        '''prefixで始まる名前を名前順に最大limit件返す
+        '''
+        node = self.root
+        for char in prefix.lower():
+            node = node.get(char)
+            if node is None:
+                return []
+
+        results = []
+        stack = [node]
+        while stack and len(results) < limit:
+            node = stack.pop()
+            results.extend(sorted(
+                node.get(None, ()),
+                key=lambda item: (item['name'], item['id'])
+            ))
+            stack.extend(
+                node[char]
+                for char in sorted((c for c in node if c is not None),
+                                   reverse=True)
+            )
+        return results[:limit]
+
+
+_tries = TTLCache(
+    settings.AUTOCOMPLETE_TRIE_CACHE_SIZE,
+    settings.AUTOCOMPLETE_TRIE_CACHE_TIMEOUT
+)
+
+
+def _get_trie(model, user):
+    '''ユーザのtrieを返す。データが更新されている場合は作り直す
+    '''
+    version = get_version(user.pk)
+    key = (model._meta.label, user.pk)
+    cached = _tries.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    trie = NameTrie(model.objects.filter(user=user).values('id', 'name'))
+    _tries.set(key, (version, trie))
+    return trie
+
+
+def complete_names(model, user, prefix, limit):
+    '''ユーザのtag, ingredientから名前がprefixで始まるものを最大limit件返す
+
+    PostgreSQLでは(user, lower(name))のインデックスを使って検索し、
+    それ以外のDBではプロセス内のtrieで検索する。
+    '''
+    if connection.vendor == 'postgresql':
+        return list(model.objects.filter(user=user).annotate(
+            name_lower=Lower('name')
+        ).filter(
+            name_lower__startswith=prefix.lower()
+        ).order_by('name_lower', 'id').values('id', 'name')[:limit])
+    return _get_trie(model, user).search(prefix, limit)
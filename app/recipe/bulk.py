@@ -0,0 +1,230 @@
+from collections import Counter
+
+from django.db import connection, transaction
+
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from core.models import Recipe
+from recipe import search
+from recipe.cache import bump_version
+from recipe.counts import adjust_recipe_counts, batch_recipe_deletion
+
+
+BULK_BATCH_SIZE = 500
+
+
+def bulk_insert(model, objs, batch_size=BULK_BATCH_SIZE):
+    '''複数のオブジェクトをまとめてINSERTし、idを設定して返す
+
+    INSERT時にidを返せないDB(SQLite等)では1件ずつ保存する。
+    '''
+    objs = list(objs)
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
+
+
+def bulk_insert_m2m(instances, related, batch_size=BULK_BATCH_SIZE):
+    '''多対多の中間テーブルの行をまとめてINSERTする
+
+    relatedはinstancesと同じ順序で、フィールド名と関連オブジェクトの
+    リストの辞書を持つリスト。
+    '''
+    if not instances:
+        return
+    model = type(instances[0])
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        source = f'{field.m2m_field_name()}_id'
+        target = f'{field.m2m_reverse_field_name()}_id'
+        rows = [
+            through(**{source: instance.pk, target: obj.pk})
+            for instance, objs in zip(instances, related)
+            for obj in objs.get(field.name, ())
+        ]
+        through.objects.bulk_create(rows, batch_size=batch_size)
+        adjust_recipe_counts(field.related_model, Counter(
+            getattr(row, target) for row in rows
+        ))
+    if model is Recipe:
+        search.update_search_vector(instance.pk for instance in instances)
+
+
+def insert_new_related(model, attrs_list, batch_size=BULK_BATCH_SIZE):
+    '''多対多の関連に含まれる未保存のオブジェクトをまとめて登録する
+
+    同じユーザ、同じ名前のオブジェクトは1件だけ登録し、全てに同じidを
+    設定する。
+    '''
+    for field in model._meta.many_to_many:
+        objs = [
+            obj
+            for attrs in attrs_list
+            for obj in attrs.get(field.name, ())
+            if obj.pk is None
+        ]
+        new = {}
+        for obj in objs:
+            new.setdefault((obj.user_id, obj.name), obj)
+        bulk_insert(field.related_model, new.values(), batch_size)
+        for obj in objs:
+            obj.pk = new[(obj.user_id, obj.name)].pk
+
+
+def parse_ids(items, key=None):
+    '''リクエストのidリストを検証し、idのリストとエラーのリストを返す
+    '''
+    ids = []
+    errors = []
+    for item in items:
+        value = item.get(key) if key and isinstance(item, dict) else item
+        if isinstance(value, int) and not isinstance(value, bool):
+            ids.append(value)
+            errors.append({})
+        else:
+            ids.append(None)
+            errors.append({'id': ['A valid integer is required.']})
+    return ids, errors
+
+
+class BulkModelMixin:
+    '''一覧に対する一括登録、更新、削除のactionを提供するmixin
+
+    POSTでオブジェクトのリストを一括登録、PATCHでidを含むオブジェクトの
+    リストを一括更新、DELETEでidのリストを一括削除する。全件を検証してから
+    1つのトランザクションで処理し、エラーは要素ごとのリストで返す。
+    ValuesQuerysetMixinと併用し、処理結果は一覧のserializerで出力する。
+    '''
+    max_bulk_items = 1000
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False,
+            url_path='bulk')
+    def bulk(self, request):
+        '''一括処理のエンドポイント
+        '''
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of items.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.max_bulk_items:
+            return Response(
+                {'detail': f'No more than {self.max_bulk_items} items '
+                           'may be sent at once.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.method == 'POST':
+            response = self.bulk_create(items)
+        elif request.method == 'PATCH':
+            response = self.bulk_update(items)
+        else:
+            response = self.bulk_destroy(items)
+
+        if status.is_success(response.status_code):
+            bump_version(request.user.pk)
+        return response
+
+    def bulk_create(self, items):
+        '''オブジェクトを一括登録する
+        '''
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            instances = serializer.save(user=self.request.user)
+        return Response(
+            self.get_bulk_data(instances),
+            status=status.HTTP_201_CREATED
+        )
+
+    def bulk_update(self, items):
+        '''idを指定してオブジェクトを一括更新する
+        '''
+        ids, errors = parse_ids(items, key='id')
+        instances = self.get_queryset().in_bulk(
+            [pk for pk in ids if pk is not None]
+        )
+
+        valid_serializers = []
+        for index, (pk, item) in enumerate(zip(ids, items)):
+            if pk is None:
+                continue
+            if pk not in instances:
+                errors[index] = {'id': ['Not found.']}
+                continue
+            serializer = self.get_serializer(
+                instances[pk],
+                data=item,
+                partial=True
+            )
+            if serializer.is_valid():
+                valid_serializers.append(serializer)
+            else:
+                errors[index] = serializer.errors
+
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            insert_new_related(self.get_queryset().model, [
+                serializer.validated_data for serializer in valid_serializers
+            ])
+            instances = [
+                serializer.save() for serializer in valid_serializers
+            ]
+        return Response(self.get_bulk_data(instances))
+
+    def get_bulk_data(self, instances):
+        '''登録、更新したオブジェクトを一覧のvalues serializerで出力する
+
+        オブジェクト毎に関連を取得しないよう、idで行を取得し直して関連を
+        まとめて取得する。件数に関わらずクエリ数は一定となる。
+        '''
+        serializer_class = self.values_serializer_classes['list']
+        context = self.get_serializer_context()
+        columns = serializer_class(context=context).get_columns()
+        ids = [instance.pk for instance in instances]
+        rows = {
+            row[0]: row
+            for row in self.get_queryset().model.objects.filter(
+                pk__in=ids
+            ).values_list(*columns, named=True)
+        }
+        return serializer_class(
+            [rows[pk] for pk in ids],
+            many=True,
+            context=context
+        ).data
+
+    def bulk_destroy(self, items):
+        '''idのリストを指定してオブジェクトを一括削除する
+        '''
+        ids, errors = parse_ids(items)
+        found = set(self.get_queryset().filter(
+            id__in=[pk for pk in ids if pk is not None]
+        ).values_list('id', flat=True))
+        for index, pk in enumerate(ids):
+            if pk is not None and pk not in found:
+                errors[index] = {'id': ['Not found.']}
+
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset().filter(id__in=found)
+        with transaction.atomic():
+            if queryset.model is Recipe:
+                with batch_recipe_deletion(found):
+                    queryset.delete()
+            else:
+                queryset.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,172 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import http_date, parse_etags, quote_etag, urlencode
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+VERSION_KEY = 'recipe-api:version:{user_id}'
+RESPONSE_KEY = 'recipe-api:response:{user_id}:{version}:{view}:{params}'
+
+
+def get_cache():
+    '''レシピAPI用のキャッシュを返す
+    '''
+    return caches[settings.RECIPE_API_CACHE_ALIAS]
+
+
+def new_version():
+    '''新しいバージョンの初期値を返す
+
+    バージョンのキーが削除(evict, clear, 再起動)された後に、以前と同じ
+    バージョンから数え直してキャッシュ済みのレスポンスやETagが再び
+    有効にならないよう、繰り返さない値(現在時刻のナノ秒)とする。
+    '''
+    return time.time_ns()
+
+
+def add_version(cache, key):
+    '''新しいバージョンを登録する
+
+    シグナルを経由しない更新(QuerySet.update, 他のプロセスでの更新等)でも
+    古いレスポンス、ETagを使い続けないよう、バージョンはレスポンスと同じ
+    RECIPE_API_CACHE_TIMEOUTで期限切れとし、新しいバージョンに切り替える。
+    '''
+    version = new_version()
+    cache.add(key, version, settings.RECIPE_API_CACHE_TIMEOUT)
+    return cache.get(key, version)
+
+
+def get_version(user_id):
+    '''ユーザのデータのバージョンを返す
+    '''
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        version = add_version(cache, key)
+    return version
+
+
+def bump_version(user_id):
+    '''ユーザのデータのバージョンを更新し、キャッシュ済みのレスポンスを無効化する
+
+    バージョンはキャッシュに保持するため、プロセス毎のLocMemCacheでは
+    他のプロセスのキャッシュは無効化されない(バージョンの期限切れまで
+    古いレスポンスを返す)。複数のworkerや管理コマンドでの更新を即時に
+    反映するにはmemcached, redis等の共有キャッシュを使用すること。
+    '''
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        add_version(cache, key)
+        return cache.incr(key)
+
+
+def response_cache_key(request, view_name, pk=None):
+    '''ユーザ、バージョン、正規化したリクエスト内容からキーを生成する
+    '''
+    params = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    renderer = getattr(request, 'accepted_renderer', None)
+    media_format = renderer.format if renderer else ''
+    digest = hashlib.md5(
+        f'{request.get_host()}:{media_format}:{pk}?{params}'.encode()
+    ).hexdigest()
+    return RESPONSE_KEY.format(
+        user_id=request.user.pk,
+        version=get_version(request.user.pk),
+        view=view_name,
+        params=digest,
+    )
+
+
+def make_etag(key):
+    '''キャッシュキーからETagを生成する
+    '''
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+def etag_matches(request, etag, wildcard=True):
+    '''If-None-Matchヘッダが指定ETagと一致するかを返す
+
+    wildcardがFalseの場合は*を一致とみなさない(対象の存在を確認する前)。
+    '''
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return (wildcard and '*' in etags) or etag in etags
+
+
+def not_modified(etag):
+    '''304レスポンスを返す
+    '''
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={
+        'ETag': etag
+    })
+
+
+class CachedListMixin:
+    '''list actionのレスポンスをユーザ単位でキャッシュし、ETagを付与するmixin
+    '''
+
+    def list(self, request, *args, **kwargs):
+        '''キャッシュ済みのレスポンスがあればそれを返す
+        '''
+        cache = get_cache()
+        key = response_cache_key(request, type(self).__name__)
+        etag = make_etag(key)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data, settings.RECIPE_API_CACHE_TIMEOUT)
+        response['ETag'] = etag
+        return response
+
+
+class ConditionalRetrieveMixin:
+    '''retrieve actionにETag, Last-Modifiedを付与するmixin
+
+    ETagはユーザのバージョンから生成するため、一致する場合は
+    DBへのアクセスやserializeを行わずに304を返す。If-None-Matchの*は
+    対象が存在する場合のみ304とする。
+    '''
+
+    def retrieve(self, request, *args, **kwargs):
+        '''If-None-Matchが一致する場合は304を返す
+        '''
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        key = response_cache_key(
+            request,
+            type(self).__name__,
+            kwargs[lookup_url_kwarg]
+        )
+        etag = make_etag(key)
+        if etag_matches(request, etag, wildcard=False):
+            return not_modified(etag)
+
+        instance = self.get_object()
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        serializer = self.get_serializer(instance)
+        response = Response(serializer.data)
+        response['ETag'] = etag
+        updated_at = getattr(instance, 'updated_at', None)
+        if updated_at is not None:
+            response['Last-Modified'] = http_date(updated_at.timestamp())
+        return response
@@ -0,0 +1,117 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe
+
+
+RECIPE_ATTR_FIELDS = ('tags', 'ingredients')
+
+_batch = threading.local()
+
+
+def adjust_recipe_counts(model, deltas):
+    '''tag, ingredientのrecipe_countを{id: 増減数}に従って増減する
+
+    増減数ごとにまとめて1回のUPDATEで更新する。
+    '''
+    ids_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            ids_by_delta[delta].append(pk)
+    for delta, ids in ids_by_delta.items():
+        model.objects.filter(pk__in=ids).update(
+            recipe_count=F('recipe_count') + delta
+        )
+
+
+def linked_ids(field_name, recipe_ids, related_ids=None):
+    '''レシピに紐づくtag, ingredientのidを紐付けの数だけ返す
+    '''
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    related_column = f'{field.m2m_reverse_field_name()}_id'
+    links = through.objects.filter(**{
+        f'{field.m2m_field_name()}_id__in': recipe_ids
+    })
+    if related_ids is not None:
+        links = links.filter(**{f'{related_column}__in': related_ids})
+    return list(links.values_list(related_column, flat=True))
+
+
+def linked_counts(field_name, instance, reverse, pk_set):
+    '''m2m_changedの対象となる紐付けの数を{tag, ingredientのid: 数}で返す
+
+    pk_setがNoneの場合(clear)はinstanceの全ての紐付けを対象とする。
+    '''
+    if not reverse:
+        return Counter(linked_ids(field_name, [instance.pk], pk_set))
+
+    field = Recipe._meta.get_field(field_name)
+    links = field.remote_field.through.objects.filter(**{
+        f'{field.m2m_reverse_field_name()}_id': instance.pk
+    })
+    if pk_set is not None:
+        links = links.filter(**{f'{field.m2m_field_name()}_id__in': pk_set})
+    return {instance.pk: links.count()}
+
+
+def decrement_for_recipes(recipe_ids):
+    '''レシピの削除前に、紐づくtag, ingredientのrecipe_countを減らす
+    '''
+    for field_name in RECIPE_ATTR_FIELDS:
+        model = Recipe._meta.get_field(field_name).related_model
+        counts = Counter(linked_ids(field_name, recipe_ids))
+        adjust_recipe_counts(model, {pk: -n for pk, n in counts.items()})
+
+
+@contextmanager
+def batch_recipe_deletion(recipe_ids):
+    '''まとめて削除するレシピのrecipe_countを1度に減らす
+
+    with内ではこれらのレシピについてpre_deleteでのレシピ毎の減算を行わない。
+    '''
+    recipe_ids = set(recipe_ids)
+    decrement_for_recipes(recipe_ids)
+    previous = getattr(_batch, 'recipe_ids', frozenset())
+    _batch.recipe_ids = previous | recipe_ids
+    try:
+        yield
+    finally:
+        _batch.recipe_ids = previous
+
+
+def is_batch_deleted(recipe_id):
+    '''batch_recipe_deletionでrecipe_countを減算済みのレシピかを返す
+    '''
+    return recipe_id in getattr(_batch, 'recipe_ids', ())
+
+
+def recompute_recipe_counts():
+    '''tag, ingredientのrecipe_countを中間テーブルから再計算する
+
+    値が異なる行のみを更新し、{モデル: 更新件数}と、更新した行を持つ
+    ユーザのidの集合を返す。
+    '''
+    updated = {}
+    user_ids = set()
+    for field_name in RECIPE_ATTR_FIELDS:
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        related_column = field.m2m_reverse_field_name()
+        counts = through.objects.filter(**{
+            related_column: OuterRef('pk')
+        }).values(related_column).annotate(n=Count('pk')).values('n')
+        actual = Coalesce(Subquery(counts), 0)
+        model = field.related_model
+        stale = list(model.objects.annotate(actual=actual).exclude(
+            recipe_count=F('actual')
+        ).values_list('pk', 'user_id'))
+        user_ids.update(user_id for _, user_id in stale)
+        updated[model] = model.objects.filter(
+            pk__in=[pk for pk, _ in stale]
+        ).update(recipe_count=actual)
+    return updated, user_ids
@@ -0,0 +1,94 @@
+import csv
+import json
+from itertools import islice
+
+from core.models import Recipe
+
+
+EXPORT_CHUNK_SIZE = 2000
+CSV_FIELDS = ('id', 'title', 'time_minutes', 'price', 'link', 'tags',
+              'ingredients')
+CSV_LIST_SEPARATOR = '|'
+
+
+def iter_recipe_rows(user, chunk_size=EXPORT_CHUNK_SIZE):
+    '''ユーザの全レシピをtag名、ingredient名付きの辞書として順に返す
+
+    レシピはサーバサイドカーソルで取得し、関連する名前はchunk毎に
+    まとめて取得するため、件数に関わらずメモリ使用量は一定となる。
+    '''
+    recipes = Recipe.objects.filter(user=user).order_by('id').values_list(
+        'id', 'title', 'time_minutes', 'price', 'link'
+    ).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(recipes, chunk_size))
+        if not chunk:
+            return
+        ids = [row[0] for row in chunk]
+        tags = _related_names(ids, 'tags')
+        ingredients = _related_names(ids, 'ingredients')
+        for recipe_id, title, time_minutes, price, link in chunk:
+            yield {
+                'id': recipe_id,
+                'title': title,
+                'time_minutes': time_minutes,
+                'price': str(price),
+                'link': link,
+                'tags': tags.get(recipe_id, []),
+                'ingredients': ingredients.get(recipe_id, []),
+            }
+
+
+def _related_names(recipe_ids, field_name):
+    '''指定レシピに紐づくtag, ingredientの名前をレシピid毎にまとめて返す
+    '''
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    recipe_column = f'{field.m2m_field_name()}_id'
+    name_column = f'{field.m2m_reverse_field_name()}__name'
+
+    names = {}
+    rows = through.objects.filter(**{
+        f'{recipe_column}__in': recipe_ids
+    }).order_by(name_column).values_list(recipe_column, name_column)
+    for recipe_id, name in rows:
+        names.setdefault(recipe_id, []).append(name)
+    return names
+
+
+def render_ndjson(rows):
+    '''レシピを1行1件のJSONとして返す
+    '''
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    '''書き込まれた値をそのまま返すファイルライクオブジェクト
+    '''
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    '''レシピをヘッダ付きのCSVとして1行ずつ返す
+
+    tag, ingredientの名前はCSV_LIST_SEPARATORで連結する。
+    '''
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for row in rows:
+        row = dict(
+            row,
+            tags=CSV_LIST_SEPARATOR.join(row['tags']),
+            ingredients=CSV_LIST_SEPARATOR.join(row['ingredients'])
+        )
+        yield writer.writerow([row[field] for field in CSV_FIELDS])
+
+
+RENDERERS = {
+    'ndjson': ('application/x-ndjson', render_ndjson),
+    'csv': ('text/csv', render_csv),
+}
@@ -0,0 +1,174 @@
+from django.db.models import Q
+
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    '''リストの全要素をまとめて検証する多対多のフィールド
+    '''
+
+    def to_internal_value(self, data):
+        '''リストの全要素を1回のクエリで検証する
+        '''
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.to_internal_values(data)
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    '''リクエストユーザのオブジェクトをidで指定するフィールド
+
+    many=True指定時はidのリスト全体を1回のクエリで検証し、存在しない、
+    または他のユーザのidを全てエラーメッセージに含める。
+    '''
+    default_error_messages = {
+        'does_not_exist_many': 'Invalid pks {pk_values} - '
+                               'objects do not exist.',
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        '''many=True指定時はリストをまとめて検証するフィールドを返す
+        '''
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_user(self):
+        '''リクエストユーザを返す(リクエストがない場合はNone)
+        '''
+        request = self.context.get('request')
+        return getattr(request, 'user', None)
+
+    def get_queryset(self):
+        '''リクエストユーザのデータに絞り込んだquerysetを返す
+        '''
+        queryset = super().get_queryset()
+        user = self.get_user()
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        return queryset
+
+    def to_internal_value(self, data):
+        '''idに対応するオブジェクトを返す
+        '''
+        return self.to_internal_values([data])[0]
+
+    def to_internal_values(self, data):
+        '''リストを検証し、指定順に重複を除いたオブジェクトのリストを返す
+        '''
+        keys = [self.parse_key(value) for value in data]
+        if not keys:
+            return []
+
+        found = {}
+        for obj in self.get_queryset().filter(
+            self.get_lookup(keys)
+        ).order_by('-pk'):
+            for key in self.get_keys(obj, keys):
+                found[key] = obj
+
+        missing = []
+        objs = {}
+        for key in keys:
+            if key not in found:
+                found[key] = self.get_missing(key)
+            obj = found[key]
+            if obj is None:
+                missing.append(key[1])
+            else:
+                objs.setdefault(key if obj.pk is None else obj.pk, obj)
+
+        missing = list(dict.fromkeys(missing))
+        if len(missing) == 1:
+            self.fail('does_not_exist', pk_value=missing[0])
+        elif missing:
+            self.fail(
+                'does_not_exist_many',
+                pk_values=', '.join(f'"{pk}"' for pk in missing)
+            )
+        return list(objs.values())
+
+    def parse_key(self, value):
+        '''値を('pk', id)に変換する
+        '''
+        if isinstance(value, str) and value.strip().isdigit() and \
+                value.strip().isascii():
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int):
+            self.fail('incorrect_type', data_type=type(value).__name__)
+        return ('pk', value)
+
+    def get_lookup(self, keys):
+        '''指定された値に該当するオブジェクトを取得する条件を返す
+        '''
+        return Q(pk__in={value for kind, value in keys if kind == 'pk'})
+
+    def get_keys(self, obj, keys):
+        '''取得したオブジェクトに対応する値を返す
+        '''
+        return [('pk', obj.pk)]
+
+    def get_missing(self, key):
+        '''該当するオブジェクトがない値に対するオブジェクトを返す
+
+        Noneを返した値はエラーとする。
+        '''
+        return None
+
+
+class NameOrPrimaryKeyRelatedField(UserPrimaryKeyRelatedField):
+    '''ユーザのtag, ingredientをidまたは名前で指定するフィールド
+
+    数値(数字のみの文字列を含む)はid、それ以外の文字列は名前として扱う。
+    idと名前はリクエストユーザのデータから1回のクエリでまとめて取得し、
+    未登録の名前は未保存のオブジェクトとして返す(保存はserializerで行う)。
+    '''
+    default_error_messages = {
+        'incorrect_type': 'Incorrect type. Expected pk value or name, '
+                          'received {data_type}.',
+        'invalid_name': 'Ensure names are not blank and have no more than '
+                        '{max_length} characters.',
+        'no_user': 'Names can only be used by an authenticated user.',
+    }
+
+    def parse_key(self, value):
+        '''値を('pk', id)または('name', 名前)に変換する
+        '''
+        if not isinstance(value, str):
+            return super().parse_key(value)
+
+        value = value.strip()
+        if value.isascii() and value.isdigit():
+            return ('pk', int(value))
+        max_length = self.queryset.model._meta.get_field('name').max_length
+        if not value or len(value) > max_length:
+            self.fail('invalid_name', max_length=max_length)
+        return ('name', value)
+
+    def get_lookup(self, keys):
+        '''指定されたidまたは名前に該当するオブジェクトを取得する条件を返す
+        '''
+        names = {value for kind, value in keys if kind == 'name'}
+        return super().get_lookup(keys) | Q(name__in=names)
+
+    def get_keys(self, obj, keys):
+        '''取得したオブジェクトに対応するidと名前を返す
+        '''
+        return super().get_keys(obj, keys) + [('name', obj.name)]
+
+    def get_missing(self, key):
+        '''未登録の名前に対応する未保存のオブジェクトを返す
+        '''
+        kind, name = key
+        if kind != 'name':
+            return None
+        user = self.get_user()
+        if user is None or not user.is_authenticated:
+            self.fail('no_user')
+        return self.queryset.model(user=user, name=name)
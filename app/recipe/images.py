@@ -0,0 +1,296 @@
+import io
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from PIL import Image, features
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.models import Recipe, RecipeImageRendition, recipe_image_file_path
+
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = 'uploads/staging/'
+FORMAT_EXTENSIONS = {
+    RecipeImageRendition.JPEG: 'jpg',
+    RecipeImageRendition.WEBP: 'webp',
+}
+EXIF_ORIENTATION = 0x0112
+ORIENTATION_TRANSPOSES = {
+    2: (Image.FLIP_LEFT_RIGHT, ),
+    3: (Image.ROTATE_180, ),
+    4: (Image.FLIP_TOP_BOTTOM, ),
+    5: (Image.FLIP_LEFT_RIGHT, Image.ROTATE_90),
+    6: (Image.ROTATE_270, ),
+    7: (Image.FLIP_LEFT_RIGHT, Image.ROTATE_270),
+    8: (Image.ROTATE_90, ),
+}
+
+_executor = None
+
+
+def get_executor():
+    '''画像処理用のスレッドプールを返す
+    '''
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-image'
+        )
+    return _executor
+
+
+def stage_upload(upload):
+    '''アップロードされたファイルを一時領域に保存し、保存先の名前を返す
+    '''
+    return default_storage.save(f'{STAGING_DIR}{uuid.uuid4()}', upload)
+
+
+def schedule_processing(recipe, upload):
+    '''アップロード画像を一時保存し、バックグラウンドでの処理を予約する
+
+    RECIPE_IMAGE_ASYNCがFalseの場合はその場で処理する。
+    '''
+    staged = stage_upload(upload)
+    recipe.image_staged = staged
+    recipe.image_status = Recipe.IMAGE_PENDING
+    recipe.save(update_fields=['image_staged', 'image_status', 'updated_at'])
+
+    if settings.RECIPE_IMAGE_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(
+            _process_in_worker,
+            recipe.pk,
+            staged
+        ))
+    else:
+        process_image(recipe.pk, staged)
+
+
+def _process_in_worker(recipe_id, staged):
+    '''ワーカスレッドで画像を処理し、スレッドのDB接続を閉じる
+    '''
+    try:
+        process_image(recipe_id, staged)
+    except Exception:
+        logger.exception('Failed to store recipe image %s', staged)
+    finally:
+        connections.close_all()
+
+
+def process_image(recipe_id, staged):
+    '''一時保存した画像を検証、再エンコードし、レシピの画像と差し替える
+    '''
+    try:
+        try:
+            original, renditions = render_image(staged)
+        except Exception:
+            logger.exception('Failed to process recipe image %s', staged)
+            _mark_failed(recipe_id, staged)
+            return
+        try:
+            swap_image(recipe_id, staged, original, renditions)
+        except Exception:
+            logger.exception('Failed to store recipe image %s', staged)
+            _mark_failed(recipe_id, staged)
+    finally:
+        default_storage.delete(staged)
+
+
+def _mark_failed(recipe_id, staged):
+    '''画像処理に失敗したことを記録する
+    '''
+    recipe = Recipe.objects.filter(pk=recipe_id, image_staged=staged).first()
+    if recipe is not None:
+        recipe.image_staged = ''
+        recipe.image_status = Recipe.IMAGE_FAILED
+        recipe.save(
+            update_fields=['image_staged', 'image_status', 'updated_at']
+        )
+
+
+def render_image(staged):
+    '''画像を検証し、EXIFを除いた画像と各サイズ、形式のサムネイルを返す
+
+    サムネイルは(幅, 形式, データ)のリストで返す。元画像より大きい幅は
+    元画像の幅にまとめ、拡大はしない。
+    '''
+    with default_storage.open(staged) as f:
+        Image.open(f).verify()
+        f.seek(0)
+        image = Image.open(f)
+        image.load()
+
+    image = _apply_orientation(image).convert('RGB')
+    widths = sorted({
+        min(width, image.width)
+        for width in settings.RECIPE_IMAGE_RENDITION_WIDTHS
+    })
+    renditions = []
+    for width in widths:
+        resized = _resize(image, width)
+        for image_format in get_rendition_formats():
+            renditions.append(
+                (resized.width, image_format, _encode(resized, image_format))
+            )
+    return _encode(image), renditions
+
+
+def get_rendition_formats():
+    '''生成するサムネイルの形式を返す(WebP非対応の環境ではWebPを除く)
+    '''
+    return [
+        image_format
+        for image_format in settings.RECIPE_IMAGE_RENDITION_FORMATS
+        if image_format != RecipeImageRendition.WEBP or features.check('webp')
+    ]
+
+
+def _apply_orientation(image):
+    '''EXIFのOrientationに従って画像を回転する
+    '''
+    getexif = getattr(image, '_getexif', None)
+    exif = getexif() if getexif else None
+    orientation = exif.get(EXIF_ORIENTATION) if exif else None
+    for method in ORIENTATION_TRANSPOSES.get(orientation, ()):
+        image = image.transpose(method)
+    return image
+
+
+def _resize(image, width):
+    '''指定幅以下に縮小した画像を返す(拡大はしない)
+    '''
+    resized = image.copy()
+    resized.thumbnail((width, image.height), Image.LANCZOS)
+    return resized
+
+
+def _encode(image, image_format=RecipeImageRendition.JPEG):
+    '''画像をメタデータなしの指定形式に変換する
+    '''
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        format=image_format.upper(),
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=True
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def swap_image(recipe_id, staged, original, renditions):
+    '''処理済みの画像を保存し、レシピの画像をアトミックに差し替える
+
+    処理中に新しい画像がアップロードされた場合は、処理結果を破棄する。
+    保存や差し替えに失敗した場合は、保存済みの画像を削除して例外を送出する。
+    '''
+    new_names = []
+    try:
+        image_name = default_storage.save(
+            recipe_image_file_path(None, 'image.jpg'),
+            original
+        )
+        new_names.append(image_name)
+        rendition_names = []
+        for width, image_format, content in renditions:
+            name = default_storage.save(
+                recipe_image_file_path(
+                    None,
+                    f'image.{FORMAT_EXTENSIONS[image_format]}'
+                ),
+                content
+            )
+            new_names.append(name)
+            rendition_names.append((width, image_format, name))
+
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().filter(
+                pk=recipe_id,
+                image_staged=staged
+            ).first()
+            if recipe is None:
+                old_names = new_names
+            else:
+                old_names = [recipe.image.name] if recipe.image else []
+                old_renditions = recipe.image_renditions.all()
+                old_names += [
+                    rendition.image.name for rendition in old_renditions
+                ]
+                old_renditions.delete()
+                RecipeImageRendition.objects.bulk_create([
+                    RecipeImageRendition(
+                        recipe=recipe,
+                        width=width,
+                        format=image_format,
+                        image=name
+                    )
+                    for width, image_format, name in rendition_names
+                ])
+                recipe.image = image_name
+                recipe.image_staged = ''
+                recipe.image_status = Recipe.IMAGE_READY
+                recipe.save()
+    except Exception:
+        for name in new_names:
+            default_storage.delete(name)
+        raise
+
+    for name in old_names:
+        default_storage.delete(name)
+
+
+def recover_stale_images(max_age, reprocess=False):
+    '''一定時間以上pendingのままのレシピの画像を処理し直すか失敗とし、
+    参照されていない一時ファイルを削除する
+
+    ワーカの再起動等で失われた処理を回復する。reprocessがTrueの場合は
+    一時ファイルが残っていればその場で処理し、それ以外は失敗とする。
+    (処理し直した数, 失敗とした数, 削除した一時ファイルの数)を返す。
+    '''
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    stale = Recipe.objects.filter(
+        image_status=Recipe.IMAGE_PENDING,
+        updated_at__lt=cutoff
+    ).values_list('pk', 'image_staged')
+
+    reprocessed = failed = 0
+    for recipe_id, staged in stale:
+        if reprocess and staged and default_storage.exists(staged):
+            process_image(recipe_id, staged)
+            reprocessed += 1
+        else:
+            _mark_failed(recipe_id, staged)
+            if staged:
+                default_storage.delete(staged)
+            failed += 1
+    return reprocessed, failed, clean_staging(cutoff)
+
+
+def clean_staging(cutoff):
+    '''pendingのレシピから参照されていない、cutoffより前の一時ファイルを
+    削除し、削除した数を返す
+    '''
+    try:
+        _, files = default_storage.listdir(STAGING_DIR)
+    except FileNotFoundError:
+        return 0
+
+    referenced = set(Recipe.objects.filter(
+        image_status=Recipe.IMAGE_PENDING
+    ).exclude(image_staged='').values_list('image_staged', flat=True))
+    removed = 0
+    for name in files:
+        staged = f'{STAGING_DIR}{name}'
+        if staged in referenced:
+            continue
+        if default_storage.get_modified_time(staged) < cutoff:
+            default_storage.delete(staged)
+            removed += 1
+    return removed
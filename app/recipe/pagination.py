@@ -0,0 +1,41 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    '''cursor(keyset)方式のページネーション
+
+    page_sizeまたはcursorパラメータが指定された場合のみページ分割を行い、
+    指定がない場合は従来通り全件をリストで返す。
+    '''
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        '''ページ分割が要求された場合のみページを返す
+        '''
+        params = request.query_params
+        if self.page_size_query_param not in params and \
+                self.cursor_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        '''viewが並び順を指定している場合はそれを使用する
+        '''
+        get_list_ordering = getattr(view, 'get_list_ordering', None)
+        if get_list_ordering is not None:
+            return get_list_ordering()
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(OptInCursorPagination):
+    '''tag, ingredient一覧用ページネーション
+    '''
+    ordering = ('-name', '-id')
+
+
+class RecipeCursorPagination(OptInCursorPagination):
+    '''recipe一覧用ページネーション
+    '''
+    ordering = '-id'
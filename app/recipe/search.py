@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+
+from core.models import Recipe
+
+
+UPDATE_SEARCH_VECTOR_SQL = '''
+UPDATE core_recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, core_recipe.title), 'A') ||
+    setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(core_tag.name, ' ')
+        FROM core_tag
+        JOIN core_recipe_tags ON core_recipe_tags.tag_id = core_tag.id
+        WHERE core_recipe_tags.recipe_id = core_recipe.id
+    ), '')), 'B') ||
+    setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(core_ingredient.name, ' ')
+        FROM core_ingredient
+        JOIN core_recipe_ingredients
+            ON core_recipe_ingredients.ingredient_id = core_ingredient.id
+        WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+    ), '')), 'B')
+WHERE core_recipe.id = ANY(%(ids)s)
+'''
+
+
+def is_supported():
+    '''DBが全文検索(tsvector)に対応しているかを返す
+    '''
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vector(recipe_ids):
+    '''指定レシピの検索用ベクトルをタイトル、tag名、ingredient名から更新する
+
+    全文検索に対応していないDBでは何もしない。
+    '''
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_SEARCH_VECTOR_SQL, {
+            'config': settings.RECIPE_SEARCH_CONFIG,
+            'ids': recipe_ids,
+        })
+
+
+def search_recipes(queryset, text):
+    '''レシピをタイトル、tag名、ingredient名で検索する
+
+    PostgreSQLではGINインデックス付きのtsvectorで検索し、関連度をrankとして
+    付与する。それ以外のDBでは部分一致で検索する。
+    '''
+    if is_supported():
+        query = SearchQuery(text, config=settings.RECIPE_SEARCH_CONFIG)
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).filter(search_vector=query)
+
+    condition = Q(title__icontains=text)
+    for field_name in ('tags', 'ingredients'):
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        annotation = f'{field_name}_matched'
+        queryset = queryset.annotate(**{
+            annotation: Exists(through.objects.filter(**{
+                field.m2m_field_name(): OuterRef('pk'),
+                f'{field.m2m_reverse_field_name()}__name__icontains': text,
+            }))
+        })
+        condition |= Q(**{annotation: True})
+    return queryset.filter(condition)
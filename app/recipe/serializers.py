@@ -1,6 +1,33 @@
+from collections import OrderedDict
+
 from rest_framework import serializers
 
-from core.models import Tag, Ingredient, Recipe
+from core.models import Tag, Ingredient, Recipe, RecipeImageRendition
+from recipe.bulk import bulk_insert, bulk_insert_m2m, insert_new_related
+from recipe.fields import NameOrPrimaryKeyRelatedField
+from recipe.values import ValuesSerializer
+
+
+class BulkCreateListSerializer(serializers.ListSerializer):
+    '''複数オブジェクトの登録をまとめてINSERTするListSerializer
+    '''
+
+    def create(self, validated_data):
+        '''オブジェクトと多対多の中間テーブルの行をまとめて登録する
+        '''
+        model = self.child.Meta.model
+        insert_new_related(model, validated_data)
+        m2m_names = [field.name for field in model._meta.many_to_many]
+        related = [
+            {name: attrs.pop(name) for name in m2m_names if name in attrs}
+            for attrs in validated_data
+        ]
+        instances = bulk_insert(
+            model,
+            (model(**attrs) for attrs in validated_data)
+        )
+        bulk_insert_m2m(instances, related)
+        return instances
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -9,8 +36,9 @@ class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id', )
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
+        list_serializer_class = BulkCreateListSerializer
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -19,18 +47,63 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
-        resd_only_fields = ('id', )
+        fields = ('id', 'name', 'recipe_count')
+        resd_only_fields = ('id', 'recipe_count')
+        list_serializer_class = BulkCreateListSerializer
+
+
+class RecipeImageRenditionSerializer(serializers.ModelSerializer):
+    '''レシピ画像のサムネイルのserializer
+    '''
 
+    class Meta:
+        model = RecipeImageRendition
+        fields = ('width', 'format', 'image')
+        read_only_fields = ('width', 'format', 'image')
+
+
+class SparseFieldsMixin:
+    '''contextのfields, expandに従って出力するフィールドを選択するmixin
+
+    fieldsを指定した場合は指定したフィールドのみを出力し、expandに指定した
+    関連はidではなくネストしたオブジェクトとして出力する。
+    '''
+    expandable_fields = {}
 
-class RecipeSerializer(serializers.ModelSerializer):
+    def get_fields(self):
+        '''出力するフィールドを返す
+        '''
+        fields = super().get_fields()
+        for name in self.context.get('expand', ()):
+            fields[name] = self.expandable_fields[name](
+                many=True,
+                read_only=True
+            )
+        requested = self.context.get('fields')
+        if requested is not None:
+            fields = OrderedDict(
+                (name, field) for name, field in fields.items()
+                if name in requested
+            )
+        return fields
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     '''Recipeモデルのserializer
     '''
-    ingredients = serializers.PrimaryKeyRelatedField(
+    expandable_fields = {
+        'tags': TagSerializer,
+        'ingredients': IngredientSerializer,
+    }
+    image_renditions = RecipeImageRenditionSerializer(
+        many=True,
+        read_only=True
+    )
+    ingredients = NameOrPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = NameOrPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -38,8 +111,21 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
-                  'price', 'link')
+                  'price', 'link', 'image_renditions')
         read_only_fields = ('id', )
+        list_serializer_class = BulkCreateListSerializer
+
+    def create(self, validated_data):
+        '''名前で指定された未登録のtag, ingredientを登録してからレシピを登録する
+        '''
+        insert_new_related(Recipe, [validated_data])
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        '''名前で指定された未登録のtag, ingredientを登録してからレシピを更新する
+        '''
+        insert_new_related(Recipe, [validated_data])
+        return super().update(instance, validated_data)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -49,11 +135,37 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class TagValuesSerializer(ValuesSerializer):
+    '''tag一覧用の読み取り専用serializer
+    '''
+    serializer_class = TagSerializer
+
+
+class IngredientValuesSerializer(ValuesSerializer):
+    '''Ingredient一覧用の読み取り専用serializer
+    '''
+    serializer_class = IngredientSerializer
+
+
+class RecipeValuesSerializer(ValuesSerializer):
+    '''Recipe一覧用の読み取り専用serializer
+    '''
+    serializer_class = RecipeSerializer
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
-    '''画像アップロード用serializer
+    '''画像アップロード結果のserializer
     '''
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id', )
+        fields = ('id', 'image', 'image_status')
+        read_only_fields = ('id', 'image', 'image_status')
+
+
+class RecipeImageUploadSerializer(serializers.Serializer):
+    '''画像アップロード用serializer
+
+    画像の検証はバックグラウンド処理で行うため、ここではファイルのみ受け付ける。
+    '''
+    image = serializers.FileField()
@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Tag, Ingredient, Recipe
+from recipe import counts, search
+from recipe.cache import bump_version
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def invalidate_user_lists(sender, instance, **kwargs):
+    '''レシピ、tag、ingredientの変更時にユーザのキャッシュを無効化する
+    '''
+    bump_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_lists_on_m2m(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    '''レシピとtag、ingredientの紐付け変更時にユーザのキャッシュを無効化し、
+    レシピの更新日時を更新する
+    '''
+    if not action.startswith('post_'):
+        return
+    bump_version(instance.user_id)
+
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif pk_set:
+        recipe_ids = list(pk_set)
+    else:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    search.update_search_vector(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    '''レシピ保存時に検索用ベクトルを更新する
+    '''
+    search.update_search_vector([instance.pk])
+
+
+def _attr_recipe_ids(instance):
+    '''tag, ingredientに紐づくレシピのidを返す
+    '''
+    field_name = 'tags' if isinstance(instance, Tag) else 'ingredients'
+    field = Recipe._meta.get_field(field_name)
+    return list(field.remote_field.through.objects.filter(**{
+        field.m2m_reverse_field_name(): instance.pk
+    }).values_list(f'{field.m2m_field_name()}_id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_attr_search_vector(sender, instance, created, **kwargs):
+    '''tag, ingredientの名前変更時に紐づくレシピの検索用ベクトルを更新する
+    '''
+    if not created and search.is_supported():
+        search.update_search_vector(_attr_recipe_ids(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_attr_recipe_ids(sender, instance, **kwargs):
+    '''削除前に紐づくレシピのidを記録する
+    '''
+    if search.is_supported():
+        instance._search_recipe_ids = _attr_recipe_ids(instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_deleted_attr_search_vector(sender, instance, **kwargs):
+    '''tag, ingredient削除後に紐づいていたレシピの検索用ベクトルを更新する
+    '''
+    search.update_search_vector(getattr(instance, '_search_recipe_ids', []))
+
+
+@receiver(post_save, sender=get_user_model())
+def reset_user_lists(sender, instance, created, **kwargs):
+    '''新規ユーザ作成時に同じidのキャッシュが再利用されないようにする
+    '''
+    if created:
+        bump_version(instance.pk)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    '''紐付けの追加、削除に合わせてtag, ingredientのrecipe_countを増減する
+
+    削除は実際に存在した紐付けのみを数えるため、pre_remove, pre_clearで
+    数を記録し、post_remove, post_clearで減らす。
+    '''
+    field_name = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    model = Recipe._meta.get_field(field_name).related_model
+    pending = instance.__dict__.setdefault('_pending_recipe_counts', {})
+
+    if action == 'post_add':
+        if reverse:
+            deltas = {instance.pk: len(pk_set)}
+        else:
+            deltas = dict.fromkeys(pk_set, 1)
+        counts.adjust_recipe_counts(model, deltas)
+    elif action in ('pre_remove', 'pre_clear'):
+        pending[sender] = counts.linked_counts(
+            field_name, instance, reverse, pk_set
+        )
+    elif action in ('post_remove', 'post_clear'):
+        deltas = pending.pop(sender, {})
+        counts.adjust_recipe_counts(
+            model,
+            {pk: -n for pk, n in deltas.items()}
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def decrement_recipe_counts(sender, instance, **kwargs):
+    '''レシピ削除時に紐づくtag, ingredientのrecipe_countを減らす
+
+    一括削除でまとめて減算済みのレシピは対象外とする。
+    '''
+    if not counts.is_batch_deleted(instance.pk):
+        counts.decrement_for_recipes([instance.pk])
@@ -0,0 +1,292 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, **params):
+    '''test用のrecipeをモデルに登録して返す。
+    '''
+    defaults = {
+        'title': 'sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def response_queries(context):
+    '''最後の更新以降(レスポンスの出力)に発行されたクエリ数を返す
+    '''
+    sqls = [query['sql'] for query in context.captured_queries]
+    writes = [
+        index for index, sql in enumerate(sqls)
+        if sql.startswith(('INSERT', 'UPDATE', 'DELETE'))
+    ]
+    return len(sqls) - writes[-1] - 1
+
+
+class BulkApiTests(TestCase):
+    '''一括登録、更新、削除APIのテスト
+    '''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_tags(self):
+        '''タグを一括登録できること
+        '''
+        payload = [{'name': 'Vegan'}, {'name': 'Dessert'}]
+
+        res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(tag['name'] for tag in res.data),
+            ['Dessert', 'Vegan']
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_recipes_with_relations(self):
+        '''tag, ingredient付きのレシピを一括登録できること
+        '''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        payload = [
+            {
+                'title': f'recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': [tag.id],
+                'ingredients': [ingredient.id],
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [tag])
+            self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_create_recipes_query_count_constant(self):
+        '''一括登録のレスポンスの出力のクエリ数が件数によらず一定であること
+        '''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+
+        def queries(count):
+            payload = [
+                {
+                    'title': f'recipe {i}',
+                    'time_minutes': 10,
+                    'price': '5.00',
+                    'tags': [tag.id],
+                    'ingredients': [ingredient.id],
+                }
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.post(
+                    RECIPES_BULK_URL,
+                    payload,
+                    format='json'
+                )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data), count)
+            self.assertEqual(res.data[0]['tags'], [tag.id])
+            return response_queries(context)
+
+        self.assertEqual(queries(2), queries(20))
+
+    def test_bulk_update_recipes_query_count_constant(self):
+        '''一括更新のレスポンスの出力のクエリ数が件数によらず一定であること
+        '''
+        recipes = [
+            sample_recipe(user=self.user, title=f'recipe {i}')
+            for i in range(10)
+        ]
+
+        def queries(count):
+            payload = [
+                {'id': recipe.id, 'title': 'updated'}
+                for recipe in recipes[:count]
+            ]
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.patch(
+                    RECIPES_BULK_URL,
+                    payload,
+                    format='json'
+                )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [recipe['id'] for recipe in res.data],
+                [recipe.id for recipe in recipes[:count]]
+            )
+            return response_queries(context)
+
+        self.assertEqual(queries(2), queries(10))
+
+    def test_bulk_create_recipes_with_new_names(self):
+        '''複数のレシピで指定した同じ名前の未登録tagは1件だけ登録されること
+        '''
+        payload = [
+            {
+                'title': f'recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': ['Vegan', f'tag {i}'],
+                'ingredients': ['Tofu'],
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        vegan = Tag.objects.get(user=self.user, name='Vegan')
+        tofu = Ingredient.objects.get(user=self.user, name='Tofu')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        for recipe in Recipe.objects.filter(user=self.user):
+            self.assertIn(vegan, recipe.tags.all())
+            self.assertEqual(list(recipe.ingredients.all()), [tofu])
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.recipe_count, 3)
+
+    def test_bulk_create_reports_item_errors(self):
+        '''不正な要素がある場合は何も登録せず、要素ごとのエラーを返すこと
+        '''
+        payload = [{'name': 'Vegan'}, {'name': ''}]
+
+        res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('name', res.data[1])
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_requires_list(self):
+        '''リスト以外のリクエストはステータスコード400が返ること
+        '''
+        res = self.client.post(TAGS_BULK_URL, {'name': 'Vegan'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_recipes(self):
+        '''レシピを一括更新できること
+        '''
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        payload = [
+            {'id': recipe1.id, 'title': 'Curry'},
+            {'id': recipe2.id, 'tags': [tag.id]},
+        ]
+
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        self.assertEqual(recipe1.title, 'Curry')
+        self.assertEqual(list(recipe2.tags.all()), [tag])
+
+    def test_bulk_update_other_users_recipe(self):
+        '''他ユーザのレシピは更新できないこと
+        '''
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass'
+        )
+        recipe = sample_recipe(user=user2)
+
+        res = self.client.patch(
+            RECIPES_BULK_URL,
+            [{'id': recipe.id, 'title': 'Curry'}],
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', res.data[0])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'sample recipe')
+
+    def test_bulk_delete_recipes(self):
+        '''レシピを一括削除できること
+        '''
+        recipes = [sample_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.delete(
+            RECIPES_BULK_URL,
+            [recipes[0].id, recipes[1].id],
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(Recipe.objects.values_list('id', flat=True)),
+            [recipes[2].id]
+        )
+
+    def test_bulk_delete_recipes_decrements_counts_once(self):
+        '''一括削除でrecipe_countをまとめて減らし、クエリ数が件数によらず
+        一定であること
+        '''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        recipes = []
+        for _ in range(12):
+            recipe = sample_recipe(user=self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+            recipes.append(recipe)
+
+        def queries(deleted):
+            ids = [recipe.id for recipe in deleted]
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.delete(RECIPES_BULK_URL, ids, format='json')
+            self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+            return len(context)
+
+        self.assertEqual(queries(recipes[:2]), queries(recipes[2:10]))
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 2)
+        self.assertEqual(ingredient.recipe_count, 2)
+
+    def test_bulk_create_invalidates_list_cache(self):
+        '''一括登録後の一覧取得で登録したレシピが返されること
+        '''
+        self.client.get(RECIPES_URL)
+        payload = [{
+            'title': 'Curry',
+            'time_minutes': 10,
+            'price': '5.00',
+            'tags': [],
+            'ingredients': [],
+        }]
+
+        self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 1)
@@ -0,0 +1,233 @@
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+from recipe.cache import bump_version, get_version
+
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    '''指定idのレシピ取得用URLを返す
+    '''
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ListCacheTests(TestCase):
+    '''一覧APIのキャッシュのテスト
+    '''
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00
+        )
+
+    def test_list_cached(self):
+        '''2回目以降の一覧取得でDBへのクエリが発行されないこと
+        '''
+        res1 = self.client.get(RECIPES_URL)
+        with self.assertNumQueries(0):
+            res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res1.data, res2.data)
+
+    def test_list_cache_keyed_by_params(self):
+        '''クエリパラメータごとに別のキャッシュとなること
+        '''
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Lunch')
+        self.recipe.tags.add(tag)
+
+        res1 = self.client.get(TAGS_URL)
+        res2 = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res1.data), 2)
+        self.assertEqual(len(res2.data), 1)
+
+    def test_list_cache_invalidated_on_save(self):
+        '''tagの登録、削除でキャッシュが無効化されること
+        '''
+        self.client.get(TAGS_URL)
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(len(res.data), 1)
+
+        tag.delete()
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(len(res.data), 0)
+
+    def test_list_cache_invalidated_on_m2m_change(self):
+        '''レシピとtagの紐付け変更でキャッシュが無効化されること
+        '''
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        self.client.get(RECIPES_URL)
+
+        self.recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['tags'], [tag.id])
+
+    def test_list_cache_limited_to_user(self):
+        '''他ユーザの変更で自分のキャッシュが無効化されないこと
+        '''
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass'
+        )
+        self.client.get(TAGS_URL)
+
+        Tag.objects.create(user=user2, name='Lunch')
+
+        with self.assertNumQueries(0):
+            self.client.get(TAGS_URL)
+
+    def test_version_not_reused_after_cache_cleared(self):
+        '''バージョンのキーが削除された後も以前のバージョンを再び使わないこと
+        '''
+        versions = [get_version(self.user.pk)]
+        for i in range(2):
+            versions.append(bump_version(self.user.pk))
+            cache.clear()
+            versions.append(get_version(self.user.pk))
+
+        self.assertEqual(len(set(versions)), len(versions))
+
+
+class ConditionalGetTests(TestCase):
+    '''ETagによる条件付きGETのテスト
+    '''
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00
+        )
+
+    def test_list_not_modified(self):
+        '''ETagが一致する場合に一覧取得で304が返ること
+        '''
+        res = self.client.get(TAGS_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_retrieve_not_modified(self):
+        '''ETagが一致する場合にDBへアクセスせずに304が返ること
+        '''
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url)
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_on_update(self):
+        '''データ更新後はETagが変わり、200が返ること
+        '''
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url)
+        etag = res['ETag']
+        updated_at = self.recipe.updated_at
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.recipe.refresh_from_db()
+        self.assertGreater(self.recipe.updated_at, updated_at)
+
+    def test_etag_not_reused_after_cache_cleared(self):
+        '''キャッシュが削除された後も以前のETagで304が返らないこと
+        '''
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+        Recipe.objects.create(
+            user=self.user,
+            title='Omelette',
+            time_minutes=5,
+            price=2.00
+        )
+        cache.clear()
+        Recipe.objects.create(
+            user=self.user,
+            title='Waffles',
+            time_minutes=10,
+            price=4.00
+        )
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+
+    def test_etag_expires_with_cache_timeout(self):
+        '''シグナルを経由しない更新も、キャッシュの期限切れ後はETagが変わり
+        反映されること
+        '''
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+        Recipe.objects.bulk_create([Recipe(
+            user=self.user,
+            title='Omelette',
+            time_minutes=5,
+            price=2.00
+        )])
+
+        expired = time.time() + settings.RECIPE_API_CACHE_TIMEOUT + 1
+        with patch('django.core.cache.backends.locmem.time.time',
+                   return_value=expired):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_retrieve_wildcard_requires_existing_recipe(self):
+        '''If-None-Match: *は存在するレシピのみ304となること
+        '''
+        res = self.client.get(detail_url(9999), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(
+            detail_url(self.recipe.id),
+            HTTP_IF_NONE_MATCH='*'
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
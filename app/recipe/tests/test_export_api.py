@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.export import iter_recipe_rows
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RecipeExportApiTests(TestCase):
+    '''レシピ出力APIのテスト
+    '''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Thai curry',
+            time_minutes=20,
+            price=7.00
+        )
+        self.recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Spicy'),
+            Tag.objects.create(user=self.user, name='Asian')
+        )
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Prawns')
+        )
+
+    def test_export_ndjson(self):
+        '''NDJSONで出力されること
+        '''
+        other = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass'
+        )
+        Recipe.objects.create(
+            user=other,
+            title='Fish and chips',
+            time_minutes=10,
+            price=5.00
+        )
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{
+            'id': self.recipe.id,
+            'title': 'Thai curry',
+            'time_minutes': 20,
+            'price': '7.00',
+            'link': '',
+            'tags': ['Asian', 'Spicy'],
+            'ingredients': ['Prawns'],
+        }])
+
+    def test_export_csv(self):
+        '''CSVで出力されること
+        '''
+        res = self.client.get(EXPORT_URL, {'file_format': 'csv'})
+
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Thai curry')
+        self.assertEqual(rows[0]['tags'], 'Asian|Spicy')
+
+    def test_export_invalid_format(self):
+        '''不正な形式の指定でステータスコード400が返ること
+        '''
+        res = self.client.get(EXPORT_URL, {'file_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_query_count_per_chunk(self):
+        '''クエリ数がレシピ件数ではなくchunk数に比例すること
+        '''
+        for i in range(9):
+            Recipe.objects.create(
+                user=self.user,
+                title=f'recipe {i}',
+                time_minutes=5,
+                price=1.00
+            )
+
+        with self.assertNumQueries(1 + 2 * 2):
+            rows = list(iter_recipe_rows(self.user, chunk_size=5))
+
+        self.assertEqual(len(rows), 10)
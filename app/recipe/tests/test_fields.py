@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory
+
+from core.models import Tag
+
+from recipe.fields import UserPrimaryKeyRelatedField
+
+
+class TagIdsSerializer(serializers.Serializer):
+    '''test用のtagのidリストを受け付けるserializer
+    '''
+    tags = UserPrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+
+
+class UserPrimaryKeyRelatedFieldTests(TestCase):
+    '''UserPrimaryKeyRelatedFieldのテスト
+    '''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass'
+        )
+        request = APIRequestFactory().post('/')
+        request.user = self.user
+        self.context = {'request': request}
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'tag {i}')
+            for i in range(30)
+        ]
+
+    def test_validate_ids_in_one_query(self):
+        '''idのリストを1回のクエリで検証し、指定順に重複を除いて返すこと
+        '''
+        ids = [tag.id for tag in reversed(self.tags)]
+        serializer = TagIdsSerializer(
+            data={'tags': ids + [str(ids[0])]},
+            context=self.context
+        )
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            serializer.validated_data['tags'],
+            list(reversed(self.tags))
+        )
+
+    def test_missing_and_other_users_ids(self):
+        '''存在しないidと他のユーザのidを全てエラーとして返すこと
+        '''
+        other_tag = Tag.objects.create(user=self.other, name='other')
+        serializer = TagIdsSerializer(
+            data={'tags': [self.tags[0].id, other_tag.id, 9999]},
+            context=self.context
+        )
+
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors['tags'],
+            [f'Invalid pks "{other_tag.id}", "9999" - objects do not exist.']
+        )
+
+    def test_single_missing_id(self):
+        '''存在しないidが1件の場合はDRFと同じエラーを返すこと
+        '''
+        serializer = TagIdsSerializer(
+            data={'tags': [9999]},
+            context=self.context
+        )
+
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors['tags'],
+            ['Invalid pk "9999" - object does not exist.']
+        )
+
+    def test_incorrect_type(self):
+        '''id以外の値はエラーとなること
+        '''
+        for value in ('Vegan', True, {'id': 1}):
+            serializer = TagIdsSerializer(
+                data={'tags': [value]},
+                context=self.context
+            )
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('Incorrect type', serializer.errors['tags'][0])
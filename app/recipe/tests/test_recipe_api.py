@@ -1,18 +1,24 @@
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, RecipeImageRendition, Tag, Ingredient
 
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import RecipeViewSet
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
@@ -183,6 +189,92 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_with_names(self):
+        '''tag, ingredientを名前とidの混在で指定してレシピを登録できること
+        '''
+        tag = sample_tag(user=self.user, name='Vegan')
+        ingredient = sample_ingredient(user=self.user, name='Tofu')
+        payload = {
+            'title': 'Mapo tofu',
+            'tags': [tag.id, 'Spicy', 'Vegan'],
+            'ingredients': ['Tofu', 'Chili oil', 'Chili oil'],
+            'time_minutes': 20,
+            'price': '7.00'
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        spicy = Tag.objects.get(user=self.user, name='Spicy')
+        chili_oil = Ingredient.objects.get(user=self.user, name='Chili oil')
+        self.assertEqual(set(recipe.tags.all()), {tag, spicy})
+        self.assertEqual(
+            set(recipe.ingredients.all()),
+            {ingredient, chili_oil}
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_recipe_relation_queries_constant(self):
+        '''指定したtagの数に関わらずtagの検証が1回のクエリで行われること
+        '''
+        tags = [
+            sample_tag(user=self.user, name=f'tag {i}') for i in range(20)
+        ]
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 20,
+            'price': '7.00',
+            'ingredients': [],
+        }
+        queries = []
+        for tag_ids in ([tags[0].id], [tag.id for tag in tags]):
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.post(
+                    RECIPES_URL,
+                    dict(payload, tags=tag_ids),
+                    format='json'
+                )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            queries.append([query['sql'] for query in context])
+
+        self.assertEqual(len(queries[0]), len(queries[1]))
+        validation = [
+            sql for sql in queries[1]
+            if 'FROM "core_tag" WHERE' in sql and '"user_id" =' in sql
+        ]
+        self.assertEqual(len(validation), 1)
+
+    def test_create_recipe_with_other_users_tag(self):
+        '''他のユーザのtagのidは指定できず、同名のtagは自分のものになること
+        '''
+        other = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass'
+        )
+        tag = sample_tag(user=other, name='Vegan')
+        payload = {
+            'title': 'Salad',
+            'time_minutes': 5,
+            'price': '3.00',
+            'ingredients': [],
+        }
+
+        res = self.client.post(
+            RECIPES_URL,
+            dict(payload, tags=[tag.id]),
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(
+            RECIPES_URL,
+            dict(payload, tags=['Vegan']),
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(res.data['tags'], [tag.id])
+        self.assertEqual(Tag.objects.filter(name='Vegan').count(), 2)
+
     def test_partial_update_recipe(self):
         '''レシピ更新(patch)
         '''
@@ -268,7 +360,274 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_filter_recipes_by_tags_unique(self):
+        '''複数の指定タグを持つレシピが重複して返されないこと
+        '''
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_filter_recipes_match_all(self):
+        '''match=allで指定タグ・材料を全て持つレシピのみが返されること
+        '''
+        recipe1 = sample_recipe(user=self.user, title='Vegan curry')
+        recipe2 = sample_recipe(user=self.user, title='Vegan cake')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Curry')
+        ingredient = sample_ingredient(user=self.user, name='Rice')
+        recipe1.tags.add(tag1, tag2)
+        recipe1.ingredients.add(ingredient)
+        recipe2.tags.add(tag1)
+        recipe2.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPES_URL, {
+            'tags': f'{tag1.id},{tag2.id}',
+            'ingredients': f'{ingredient.id}',
+            'match': 'all',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [RecipeSerializer(recipe1).data])
+
+    def test_filter_recipes_invalid_params(self):
+        '''不正なフィルタ指定でステータスコード400が返ること
+        '''
+        too_many_ids = ','.join(
+            str(i) for i in range(RecipeViewSet.max_filter_ids + 1)
+        )
+        for params in (
+            {'tags': 'a,b'},
+            {'ingredients': too_many_ids},
+            {'tags': '1', 'match': 'some'},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        '''タイトル、tag名、ingredient名で検索できること
+        '''
+        recipe1 = sample_recipe(user=self.user, title='Green curry')
+        recipe2 = sample_recipe(user=self.user, title='Pad thai')
+        recipe3 = sample_recipe(user=self.user, title='Tom yum')
+        recipe4 = sample_recipe(user=self.user, title='Fish and chips')
+        recipe2.tags.add(sample_tag(user=self.user, name='Curry night'))
+        recipe3.ingredients.add(
+            sample_ingredient(user=self.user, name='Curry paste')
+        )
+        recipe3.ingredients.add(
+            sample_ingredient(user=self.user, name='Red curry')
+        )
+
+        res = self.client.get(RECIPES_URL, {'q': 'curry'})
+
+        ids = [recipe['id'] for recipe in res.data]
+        self.assertEqual(
+            sorted(ids),
+            sorted([recipe1.id, recipe2.id, recipe3.id])
+        )
+        self.assertNotIn(recipe4.id, ids)
 
+    def test_filter_recipes_by_price_and_time(self):
+        '''価格、調理時間の範囲で絞り込めること
+        '''
+        sample_recipe(user=self.user, price=3.00, time_minutes=10)
+        recipe = sample_recipe(user=self.user, price=6.00, time_minutes=20)
+        sample_recipe(user=self.user, price=6.50, time_minutes=60)
+        sample_recipe(user=self.user, price=9.00, time_minutes=5)
+
+        res = self.client.get(RECIPES_URL, {
+            'price_min': '5',
+            'price_max': '8.00',
+            'time_max': 30,
+        })
+
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+    def test_order_recipes_paginated(self):
+        '''orderingの並び順でページ分割されること
+        '''
+        prices = [5.00, 2.00, 9.00, 2.00]
+        recipes = [sample_recipe(user=self.user, price=p) for p in prices]
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'ordering': 'price', 'page_size': 2}
+        )
+        ids = [r['id'] for r in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(ids, [
+            recipes[1].id, recipes[3].id, recipes[0].id, recipes[2].id
+        ])
+
+    def test_invalid_range_and_ordering(self):
+        '''不正な範囲、並び順の指定でステータスコード400が返ること
+        '''
+        for params in (
+            {'price_min': 'cheap'},
+            {'time_max': '1.5'},
+            {'time_max': '99999999999999999999999'},
+            {'price_min': 'NaN'},
+            {'price_max': 'Infinity'},
+            {'price_max': '1e30'},
+            {'ordering': 'title'},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_recipes_paginated(self):
+        '''page_size指定時に新しい順でページ分割されること
+        '''
+        recipes = [
+            sample_recipe(user=self.user, title=f'recipe {i}')
+            for i in range(3)
+        ]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipes[2].id, recipes[1].id])
+
+        res = self.client.get(res.data['next'])
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipes[0].id])
+        self.assertIsNone(res.data['next'])
+
+    def test_retrieve_recipes_page_size_capped(self):
+        '''page_sizeが上限を超える場合は上限件数に制限されること
+        '''
+        for i in range(3):
+            sample_recipe(user=self.user, title=f'recipe {i}')
+
+        with patch.object(RecipeCursorPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPES_URL, {'page_size': 100})
+
+        self.assertEqual(len(res.data['results']), 2)
+
+
+class RecipeQueryCountTests(TestCase):
+    '''レシピ取得時のクエリ数が件数に依存しないことのテスト
+    '''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        '''tag, ingredient付きのレシピを指定件数登録する
+        '''
+        for i in range(count):
+            recipe = sample_recipe(user=self.user, title=f'recipe {i}')
+            recipe.tags.add(sample_tag(user=self.user, name=f'tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'ingredient {i}')
+            )
+
+    def test_list_query_count_constant(self):
+        '''レシピ一覧のクエリ数がレシピ件数に関わらず一定であること
+        '''
+        self._create_recipes(2)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 2)
+
+        self._create_recipes(10)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 12)
+
+    def test_list_sparse_fields(self):
+        '''fields指定時は指定フィールドのみを返し、関連を先読みしないこと
+        '''
+        self._create_recipes(3)
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(len(res.data), 3)
+        for recipe in res.data:
+            self.assertEqual(set(recipe), {'id', 'title'})
+
+    def test_list_sparse_fields_paginated(self):
+        '''fields指定時もページ分割できること
+        '''
+        self._create_recipes(3)
+        res = self.client.get(
+            RECIPES_URL,
+            {'fields': 'title', 'ordering': 'price', 'page_size': 2}
+        )
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(set(res.data['results'][0]), {'title'})
+        res = self.client.get(res.data['next'])
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_list_expand_related(self):
+        '''expand指定時は一覧でもtagをネストして返し、クエリ数が一定であること
+        '''
+        self._create_recipes(5)
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                RECIPES_URL,
+                {'fields': 'id', 'expand': 'tags'}
+            )
+
+        self.assertEqual(len(res.data), 5)
+        tag = Tag.objects.get(name='tag 4')
+        self.assertEqual(res.data[0], {
+            'id': tag.recipe_set.get().id,
+            'tags': [{'id': tag.id, 'name': 'tag 4', 'recipe_count': 1}],
+        })
+
+    def test_retrieve_sparse_fields(self):
+        '''指定レシピ取得時もfieldsで出力フィールドを選択できること
+        '''
+        self._create_recipes(1)
+        recipe = Recipe.objects.get()
+        res = self.client.get(
+            detail_url(recipe.id),
+            {'fields': 'title,ingredients'}
+        )
+
+        self.assertEqual(set(res.data), {'title', 'ingredients'})
+        self.assertEqual(res.data['ingredients'][0]['name'], 'ingredient 0')
+
+    def test_invalid_sparse_fields(self):
+        '''不正なfields, expandの指定はエラーとなること
+        '''
+        for params in ({'fields': 'id,user'}, {'expand': 'image'}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_query_count_constant(self):
+        '''指定レシピ取得のクエリ数がtag, ingredient数に関わらず一定であること
+        '''
+        recipe = sample_recipe(user=self.user)
+        for i in range(10):
+            recipe.tags.add(sample_tag(user=self.user, name=f'tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'ingredient {i}')
+            )
+
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 10)
+        self.assertEqual(len(res.data['ingredients']), 10)
+
+
+@override_settings(RECIPE_IMAGE_ASYNC=False)
 class RecipeImageUploadTests(TestCase):
 
     def setUp(self):
@@ -281,6 +640,9 @@ class RecipeImageUploadTests(TestCase):
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for rendition in self.recipe.image_renditions.all():
+            rendition.image.delete()
         self.recipe.image.delete()
 
     def test_upload_image_to_recipe(self):
@@ -294,9 +656,54 @@ class RecipeImageUploadTests(TestCase):
             res = self.client.post(url, {'image': ntf}, format='multipart')
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(self.recipe.image_staged, '')
+
+    def test_upload_image_strips_exif(self):
+        '''EXIFが削除され、各サイズ、形式のサムネイルが生成されること
+        '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img = Image.new('RGB', (1000, 500))
+            img.save(ntf, format='JPEG', exif=b'Exif\x00\x00test')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as img:
+            self.assertNotIn('exif', img.info)
+
+        renditions = self.recipe.image_renditions.all()
+        self.assertEqual(
+            [(r.width, r.format) for r in renditions],
+            [(160, 'jpeg'), (160, 'webp'), (480, 'jpeg'), (480, 'webp'),
+             (1000, 'jpeg'), (1000, 'webp')]
+        )
+        for rendition in renditions:
+            with Image.open(rendition.image.path) as img:
+                self.assertEqual(img.width, rendition.width)
+                self.assertEqual(img.format.lower(), rendition.format)
+
+    def test_recipe_exposes_renditions(self):
+        '''レシピ取得時にサムネイルのURLが返されること
+        '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (200, 100)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+
+        res = self.client.get(RECIPES_URL)
+
+        renditions = res.data[0]['image_renditions']
+        self.assertEqual(
+            [(r['width'], r['format']) for r in renditions],
+            [(160, 'jpeg'), (160, 'webp'), (200, 'jpeg'), (200, 'webp')]
+        )
+        self.assertTrue(renditions[0]['image'].startswith('http'))
 
     def test_upload_image_bad_request(self):
         '''不正な画像がアップロードされた場合のテスト
@@ -305,3 +712,66 @@ class RecipeImageUploadTests(TestCase):
         res = self.client.post(url, {'image': 'not image'}, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_invalid_image_file(self):
+        '''画像でないファイルの場合は処理が失敗として記録されること
+        '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(b'not image')
+            ntf.seek(0)
+            with self.assertLogs('recipe.images', level='ERROR'):
+                res = self.client.post(
+                    url,
+                    {'image': ntf},
+                    format='multipart'
+                )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_image_store_failed(self):
+        '''画像の差し替えに失敗した場合は失敗として記録し、保存した画像を
+        削除すること
+        '''
+        url = image_upload_url(self.recipe.id)
+        bulk_create = patch.object(
+            RecipeImageRendition.objects,
+            'bulk_create',
+            side_effect=DatabaseError('failed')
+        )
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf, \
+                bulk_create, \
+                patch('recipe.images.default_storage.delete') as delete, \
+                self.assertLogs('recipe.images', level='ERROR'):
+            Image.new('RGB', (200, 100)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(self.recipe.image_staged, '')
+        self.assertFalse(self.recipe.image)
+        deleted = [call[0][0] for call in delete.call_args_list]
+        for name in deleted:
+            default_storage.delete(name)
+        self.assertEqual(len(deleted), 6)
+
+    @override_settings(RECIPE_IMAGE_ASYNC=True)
+    @patch('recipe.images.get_executor')
+    def test_upload_image_async_pending(self, mock_executor):
+        '''非同期処理時は処理を待たずにpendingで返すこと
+        '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.recipe.refresh_from_db()
+        default_storage.delete(self.recipe.image_staged)
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -11,6 +13,7 @@ from recipe.serializers import TagSerializer
 
 
 TAGS_URL = reverse('recipe:tag-list')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 
 
 class PublicTagsApiTests(TestCase):
@@ -106,6 +109,7 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
+        tag1.refresh_from_db()
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
         self.assertIn(serializer1.data, res.data)
@@ -134,3 +138,115 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_retrieve_tags_paginated(self):
+        '''page_size指定時にcursor方式でページ分割されること
+        '''
+        for name in ('Breakfast', 'Lunch', 'Dinner'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Lunch', 'Dinner'])
+        self.assertIsNone(res.data['previous'])
+
+        res = self.client.get(res.data['next'])
+
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Breakfast'])
+        self.assertIsNone(res.data['next'])
+
+    def test_retrieve_tags_assigned_without_distinct(self):
+        '''assigned_onlyの絞り込みがDISTINCTを使わずに行われること
+        '''
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe = Recipe.objects.create(
+            title='Pancakes',
+            time_minutes=5,
+            price=3.00,
+            user=self.user
+        )
+        recipe.tags.add(tag)
+
+        for assigned_only in (0, 1):
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(
+                    TAGS_URL,
+                    {'assigned_only': assigned_only}
+                )
+            self.assertEqual(len(res.data), 1)
+            for query in ctx.captured_queries:
+                self.assertNotIn('DISTINCT', query['sql'].upper())
+
+    def test_autocomplete_tags(self):
+        '''prefixで始まるタグが名前順に返されること
+        '''
+        for name in ('Vegetarian', 'vegan', 'Dessert', 'Veg', 'Lunch'):
+            Tag.objects.create(user=self.user, name=name)
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass'
+        )
+        Tag.objects.create(user=user2, name='Vegetable')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'prefix': 'VE', 'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data], ['Veg', 'vegan'])
+
+    def test_autocomplete_reflects_new_tags(self):
+        '''タグ追加後の候補に追加したタグが含まれること
+        '''
+        Tag.objects.create(user=self.user, name='Breakfast')
+        self.client.get(AUTOCOMPLETE_URL, {'prefix': 'b'})
+        Tag.objects.create(user=self.user, name='Brunch')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'prefix': 'b'})
+
+        self.assertEqual(
+            [tag['name'] for tag in res.data],
+            ['Breakfast', 'Brunch']
+        )
+
+    def test_autocomplete_invalid_limit(self):
+        '''不正なlimitの指定でステータスコード400が返ること
+        '''
+        res = self.client.get(AUTOCOMPLETE_URL, {'prefix': 'b', 'limit': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tag_recipe_count_maintained(self):
+        '''レシピとの紐付けの追加、削除でrecipe_countが増減すること
+        '''
+        tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+        tag2 = Tag.objects.create(user=self.user, name='Lunch')
+        recipes = [
+            Recipe.objects.create(
+                title=f'recipe {i}',
+                time_minutes=5,
+                price=3.00,
+                user=self.user
+            )
+            for i in range(3)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag1, tag2)
+        tag2.recipe_set.remove(recipes[0], recipes[0])
+        recipes[1].tags.remove(tag1, tag1)
+        recipes[2].delete()
+
+        tag1.refresh_from_db()
+        tag2.refresh_from_db()
+        self.assertEqual(tag1.recipe_count, 1)
+        self.assertEqual(tag2.recipe_count, 1)
+
+        recipes[0].tags.clear()
+        tag2.recipe_set.clear()
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Lunch', 0), ('Breakfast', 0)]
+        )
@@ -0,0 +1,116 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from core.models import Tag, Ingredient, Recipe, RecipeImageRendition
+
+from recipe import serializers
+from recipe.views import RecipeViewSet
+
+
+class ValuesSerializerTests(TestCase):
+    '''values_list()の行から出力するserializerのテスト
+    '''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.context = {'request': APIRequestFactory().get('/')}
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dessert', 'Breakfast')
+        ]
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        for i, price in enumerate(('5.00', '12.5', '0.99')):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'recipe {i}',
+                time_minutes=i * 10,
+                price=Decimal(price),
+                link='https://example.com' if i else ''
+            )
+            recipe.tags.add(*tags[i:])
+            if i:
+                recipe.ingredients.add(ingredient)
+        RecipeImageRendition.objects.create(
+            recipe=recipe,
+            width=160,
+            format=RecipeImageRendition.JPEG,
+            image='uploads/recipe/thumb.jpg'
+        )
+
+    def assertSameJSON(self, serializer_class, values_serializer_class,
+                       context=None):
+        '''通常のserializerと同一のJSONを出力することを確認する
+        '''
+        context = dict(self.context, **(context or {}))
+        model = serializer_class.Meta.model
+        expected = serializer_class(
+            model.objects.order_by('id'),
+            many=True,
+            context=context
+        ).data
+        values_serializer = values_serializer_class(
+            many=True,
+            context=context
+        )
+        rows = model.objects.order_by('id').values_list(
+            *values_serializer.child.get_columns(),
+            named=True
+        )
+        actual = values_serializer_class(rows, many=True, context=context).data
+
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(actual), renderer.render(expected))
+
+    def test_recipe_same_json(self):
+        '''レシピの出力が通常のserializerと同一であること
+        '''
+        self.assertSameJSON(
+            serializers.RecipeSerializer,
+            serializers.RecipeValuesSerializer
+        )
+
+    def test_recipe_sparse_fields_same_json(self):
+        '''fields指定時の出力が通常のserializerと同一であること
+        '''
+        self.assertSameJSON(
+            serializers.RecipeSerializer,
+            serializers.RecipeValuesSerializer,
+            {'fields': {'price', 'tags'}}
+        )
+
+    def test_tag_and_ingredient_same_json(self):
+        '''tag, ingredientの出力が通常のserializerと同一であること
+        '''
+        self.assertSameJSON(
+            serializers.TagSerializer,
+            serializers.TagValuesSerializer
+        )
+        self.assertSameJSON(
+            serializers.IngredientSerializer,
+            serializers.IngredientValuesSerializer
+        )
+
+    def test_list_action_uses_values_serializer(self):
+        '''一覧ではvalues_list()の行を出力するserializerを使用すること
+        '''
+        view = RecipeViewSet(action='list', format_kwarg=None)
+        view.request = APIRequestFactory().get('/')
+        view.request.query_params = {}
+        self.assertIs(
+            view.get_serializer_class(),
+            serializers.RecipeValuesSerializer
+        )
+
+        view.request.query_params = {'expand': 'tags'}
+        self.assertIs(
+            view.get_serializer_class(),
+            serializers.RecipeSerializer
+        )
@@ -0,0 +1,203 @@
+from operator import itemgetter
+
+from django.utils.functional import cached_property
+
+from rest_framework import serializers
+
+
+IDENTITY_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+)
+
+
+def _converter(field, model_field):
+    '''DBから取得した値を出力値に変換する関数を返す(変換不要ならNone)
+
+    ModelSerializerのフィールドと同じ出力になるように変換する。
+    '''
+    if isinstance(field, IDENTITY_FIELDS):
+        return None
+    if isinstance(field, serializers.FileField):
+        storage = model_field.storage
+        request = field.context.get('request')
+
+        def file_url(name):
+            if not name:
+                return None
+            url = storage.url(name)
+            if request is not None:
+                return request.build_absolute_uri(url)
+            return url
+        return file_url
+
+    def to_representation(value):
+        if value is None:
+            return None
+        return field.to_representation(value)
+    return to_representation
+
+
+class RowPlan:
+    '''serializerのフィールドから、行の取得と出力の組み立て方法を決める
+
+    フィールドの解析は初期化時に1度だけ行い、行毎には取得済みの値の
+    取り出しと変換のみを行う。関連は全行分をまとめて取得する。
+    '''
+
+    def __init__(self, model, fields, prefix=()):
+        self.model = model
+        self.columns = list(prefix)
+        self.accessors = []
+        self.relations = []
+        for name, field in fields.items():
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, serializers.ManyRelatedField):
+                self.relations.append((name, self._m2m_loader(model_field)))
+                self.accessors.append((name, None, None))
+            elif isinstance(field, serializers.ListSerializer):
+                self.relations.append((name, self._reverse_loader(
+                    model_field,
+                    field.child.fields
+                )))
+                self.accessors.append((name, None, None))
+            else:
+                self.accessors.append((
+                    name,
+                    itemgetter(self._column_index(model_field.attname)),
+                    _converter(field, model_field)
+                ))
+
+    def _column_index(self, column):
+        '''取得するカラムの位置を返す(未登録なら追加する)
+        '''
+        if column not in self.columns:
+            self.columns.append(column)
+        return self.columns.index(column)
+
+    def _m2m_loader(self, model_field):
+        '''多対多の関連のidをまとめて取得する関数を返す
+        '''
+        through = model_field.remote_field.through
+        source = f'{model_field.m2m_field_name()}_id'
+        target = f'{model_field.m2m_reverse_field_name()}_id'
+
+        def load(ids):
+            related = {}
+            rows = through.objects.filter(**{
+                f'{source}__in': ids
+            }).order_by('pk').values_list(source, target)
+            for pk, related_pk in rows:
+                related.setdefault(pk, []).append(related_pk)
+            return related
+        return load
+
+    def _reverse_loader(self, model_field, fields):
+        '''逆参照の関連オブジェクトをまとめて取得し、出力する関数を返す
+        '''
+        fk = model_field.field.attname
+        plan = RowPlan(model_field.related_model, fields, prefix=(fk, ))
+
+        def load(ids):
+            related = {}
+            rows = list(plan.model.objects.filter(**{
+                f'{fk}__in': ids
+            }).values_list(*plan.columns))
+            for row, data in zip(rows, plan.represent(rows)):
+                related.setdefault(row[0], []).append(data)
+            return related
+        return load
+
+    def represent(self, rows):
+        '''行のリストを出力のリストに変換する
+        '''
+        rows = list(rows)
+        loaded = {}
+        if self.relations:
+            ids = [row[0] for row in rows]
+            loaded = {name: load(ids) for name, load in self.relations}
+
+        results = []
+        for row in rows:
+            data = {}
+            for name, get, convert in self.accessors:
+                if get is None:
+                    data[name] = loaded[name].get(row[0], [])
+                    continue
+                value = get(row)
+                data[name] = value if convert is None else convert(value)
+            results.append(data)
+        return results
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    '''values_list()の行をまとめて出力するListSerializer
+    '''
+
+    def to_representation(self, data):
+        '''全行を出力に変換する(関連は全行分をまとめて取得する)
+        '''
+        return self.child.plan.represent(data)
+
+
+class ValuesSerializer(serializers.BaseSerializer):
+    '''values_list()の行から出力を組み立てる読み取り専用のserializer
+
+    serializer_classと同じ出力を、モデルのインスタンスやフィールドの処理を
+    介さずに組み立てる。行の先頭はidとし、関連はidで取得する。
+    '''
+    serializer_class = None
+
+    class Meta:
+        list_serializer_class = ValuesListSerializer
+
+    @cached_property
+    def plan(self):
+        '''出力の組み立て方法を返す
+        '''
+        fields = self.serializer_class(context=self.context).fields
+        return RowPlan(
+            self.serializer_class.Meta.model,
+            fields,
+            prefix=('id', )
+        )
+
+    def get_columns(self):
+        '''values_list()で取得するカラムを返す
+        '''
+        return self.plan.columns
+
+    def to_representation(self, instance):
+        '''1行を出力に変換する
+        '''
+        return self.plan.represent([instance])[0]
+
+
+class ValuesQuerysetMixin:
+    '''values_serializer_classesに指定したactionで、values_list()の行を
+    serializeするviewのmixin
+    '''
+    values_serializer_classes = {}
+
+    def use_values_serializer(self):
+        '''values_list()の行をserializeするかを返す
+        '''
+        return self.action in self.values_serializer_classes
+
+    def get_serializer_class(self):
+        '''values_serializer_classesに指定したactionではそのserializerを返す
+        '''
+        if self.use_values_serializer():
+            return self.values_serializer_classes[self.action]
+        return super().get_serializer_class()
+
+    def values_queryset(self, queryset):
+        '''serializerとページネーションに必要なカラムのみを行として取得する
+        '''
+        ordering = [name.lstrip('-') for name in queryset.query.order_by]
+        columns = dict.fromkeys(self.get_serializer().get_columns() + ordering)
+        return queryset.prefetch_related(None).values_list(
+            *columns,
+            named=True
+        )
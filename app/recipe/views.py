@@ -1,20 +1,41 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models import Count, DecimalField, Prefetch
+from django.http import StreamingHttpResponse
+
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.instrumentation import SerializerTimingMixin
 from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+from core.throttling import ScopedSlidingWindowThrottle
+from recipe import export, images, search, serializers
+from recipe.autocomplete import complete_names
+from recipe.bulk import BulkModelMixin
+from recipe.cache import CachedListMixin, ConditionalRetrieveMixin
+from recipe.pagination import RecipeAttrCursorPagination, \
+    RecipeCursorPagination
+from recipe.values import ValuesQuerysetMixin
+from user.authentication import get_token_authentication_class
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(SerializerTimingMixin,
+                            CachedListMixin,
+                            BulkModelMixin,
+                            ValuesQuerysetMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     '''レシピの属性BaseView
     '''
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (get_token_authentication_class(), )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipeAttrCursorPagination
 
     def get_queryset(self):
         '''登録済みのデータリストを返す
@@ -24,23 +45,52 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
 
-        return queryset.filter(
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by('-name', '-id')
+        if self.use_values_serializer():
+            return self.values_queryset(queryset)
+        return queryset
 
     def perform_create(self, serializer):
         '''データ登録
         '''
         serializer.save(user=self.request.user)
 
+    @action(methods=['GET'], detail=False, url_path='autocomplete',
+            url_name='autocomplete')
+    def autocomplete(self, request):
+        '''名前がprefixで始まるデータを名前順に最大limit件返す
+        '''
+        prefix = request.query_params.get('prefix', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError('limit must be an integer.')
+        if not 0 < limit <= settings.AUTOCOMPLETE_MAX_LIMIT:
+            raise ValidationError(
+                f'limit must be between 1 and '
+                f'{settings.AUTOCOMPLETE_MAX_LIMIT}.'
+            )
+        if not prefix:
+            return Response([])
+
+        return Response(complete_names(
+            self.queryset.model,
+            request.user,
+            prefix,
+            limit
+        ))
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     '''DB内のtagを管理するView
     '''
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    values_serializer_classes = {'list': serializers.TagValuesSerializer}
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -48,43 +98,284 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     '''
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    values_serializer_classes = {
+        'list': serializers.IngredientValuesSerializer
+    }
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SerializerTimingMixin,
+                    CachedListMixin,
+                    ConditionalRetrieveMixin,
+                    BulkModelMixin,
+                    ValuesQuerysetMixin,
+                    viewsets.ModelViewSet):
     '''DB内のRecipeを管理するView
     '''
     serializer_class = serializers.RecipeSerializer
+    values_serializer_classes = {'list': serializers.RecipeValuesSerializer}
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (get_token_authentication_class(), )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipeCursorPagination
+    throttle_scope = None
+
+    max_filter_ids = 100
+    match_modes = ('any', 'all')
+    ordering_fields = ('id', 'price', 'time_minutes')
+    sparse_actions = ('list', 'retrieve')
+    range_filters = (
+        ('price_min', 'price__gte', Decimal),
+        ('price_max', 'price__lte', Decimal),
+        ('time_max', 'time_minutes__lte', int),
+    )
 
     def _params_to_ints(self, qs):
         '''コンマ区切りのidをint型のidリストに変換する
         '''
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            ids = {int(str_id) for str_id in qs.split(',')}
+        except ValueError:
+            raise ValidationError('IDs must be comma separated integers.')
+        if len(ids) > self.max_filter_ids:
+            raise ValidationError(
+                f'No more than {self.max_filter_ids} IDs may be specified.'
+            )
+        return sorted(ids)
+
+    def _filter_by_related(self, queryset, field_name, ids, match):
+        '''中間テーブルのサブクエリで指定tag, ingredientを持つレシピに絞り込む
+
+        anyは指定idのいずれか、allは指定idの全てを持つレシピを返す。
+        JOINを使わないため、DISTINCTなしでも結果が重複しない。
+        '''
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        recipe_column = field.m2m_field_name()
+        related_column = field.m2m_reverse_field_name()
+
+        recipe_ids = through.objects.filter(**{
+            f'{related_column}__in': ids
+        }).values(recipe_column)
+        if match == 'all':
+            recipe_ids = recipe_ids.annotate(
+                matched=Count(related_column)
+            ).filter(matched=len(ids)).values(recipe_column)
+
+        return queryset.filter(id__in=recipe_ids)
 
     def get_queryset(self):
         '''認証済みユーザのレシピリストを返す
         '''
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match = self.request.query_params.get('match', 'any')
+        if match not in self.match_modes:
+            raise ValidationError(
+                f'match must be one of: {", ".join(self.match_modes)}.'
+            )
+
         queryset = self.queryset
         if tags is not None:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_by_related(
+                queryset, 'tags', tag_ids, match
+            )
 
         if ingredients is not None:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-        return queryset.filter(user=self.request.user)
+            queryset = self._filter_by_related(
+                queryset, 'ingredients', ingredient_ids, match
+            )
+
+        queryset = queryset.filter(**self._range_filters())
+
+        text = self._search_text()
+        if text:
+            queryset = search.search_recipes(queryset, text)
+        queryset = queryset.filter(
+            user=self.request.user
+        ).order_by(*self.get_list_ordering())
+        if self.use_values_serializer():
+            return self.values_queryset(queryset)
+
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = self._only_requested(queryset, fields)
+        return self._prefetch_related(
+            queryset,
+            fields,
+            self.get_expanded_fields()
+        )
+
+    def _range_filters(self):
+        '''price_min, price_max, time_maxを検証し、filterの条件を返す
+
+        値はカラムの範囲内の有限の数とする。
+        '''
+        filters = {}
+        for param, lookup, convert in self.range_filters:
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                value = convert(value)
+            except (ValueError, InvalidOperation):
+                raise ValidationError(f'{param} must be a number.')
+            lower, upper = self._column_range(lookup.split('__')[0])
+            if (isinstance(value, Decimal) and not value.is_finite()) \
+                    or not lower <= value <= upper:
+                raise ValidationError(
+                    f'{param} must be between {lower} and {upper}.'
+                )
+            filters[lookup] = value
+        return filters
+
+    def _column_range(self, name):
+        '''レシピのカラムに保存できる値の範囲を返す
+        '''
+        field = Recipe._meta.get_field(name)
+        if isinstance(field, DecimalField):
+            places = Decimal(1).scaleb(-field.decimal_places)
+            upper = Decimal(10) ** (
+                field.max_digits - field.decimal_places
+            ) - places
+            return -upper, upper
+        return BaseDatabaseOperations.integer_field_ranges[
+            field.get_internal_type()
+        ]
+
+    def _search_text(self):
+        '''検索文字列を返す
+        '''
+        return self.request.query_params.get('q', '').strip()
+
+    def get_list_ordering(self):
+        '''一覧の並び順を返す(ページネーションでも同じ並び順を使用する)
+
+        orderingの指定があればその順に、全文検索時は関連度の高い順に並べる。
+        同じ値の場合はidで並べる。
+        '''
+        ordering = self.request.query_params.get('ordering')
+        if ordering:
+            field = ordering.lstrip('-')
+            if field not in self.ordering_fields:
+                raise ValidationError(
+                    f'ordering must be one of: '
+                    f'{", ".join(self.ordering_fields)} '
+                    f'(prefix with - for descending).'
+                )
+            if field == 'id':
+                return (ordering, )
+            return (ordering, '-id' if ordering.startswith('-') else 'id')
+        if self._search_text() and search.is_supported():
+            return ('-rank', '-id')
+        return ('-id', )
+
+    def get_requested_fields(self):
+        '''fieldsパラメータで指定された出力フィールドを返す(指定なしはNone)
+
+        expandで指定した関連は出力フィールドに含める。
+        '''
+        if self.action not in self.sparse_actions:
+            return None
+        fields = self._param_to_names(
+            'fields',
+            self.serializer_class.Meta.fields
+        )
+        if fields is not None:
+            fields |= self.get_expanded_fields()
+        return fields
+
+    def get_expanded_fields(self):
+        '''expandパラメータで指定されたネストして出力する関連を返す
+        '''
+        if self.action != 'list':
+            return set()
+        return self._param_to_names(
+            'expand',
+            serializers.RecipeSerializer.expandable_fields
+        ) or set()
+
+    def _param_to_names(self, param, choices):
+        '''コンマ区切りのフィールド名を検証し、集合として返す
+        '''
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        if not names <= set(choices):
+            raise ValidationError(
+                f'{param} must be comma separated names from: '
+                f'{", ".join(choices)}.'
+            )
+        return names
+
+    def _only_requested(self, queryset, fields):
+        '''出力、並び替え、条件付きGETに必要なカラムのみを取得する
+        '''
+        columns = {
+            field.name for field in Recipe._meta.concrete_fields
+        }
+        ordering = {name.lstrip('-') for name in self.get_list_ordering()}
+        required = {'id', 'updated_at'} | ordering | fields
+        return queryset.only(*sorted(columns & required))
+
+    def _prefetch_related(self, queryset, fields=None, expand=()):
+        '''actionに応じて関連するtag, ingredient, 画像サムネイルを先読みする
+
+        一覧ではidのみを、指定レシピ取得時やexpand指定時はネストして表示する
+        全カラムを取得することで、レシピ件数に関わらずクエリ数を一定にする。
+        fieldsに含まれない関連は先読みしない。
+        '''
+        if self.action == 'list':
+            lookups = {
+                'tags': Prefetch('tags', queryset=Tag.objects.only('id')),
+                'ingredients': Prefetch(
+                    'ingredients',
+                    queryset=Ingredient.objects.only('id')
+                ),
+                'image_renditions': 'image_renditions',
+            }
+            for name in expand:
+                lookups[name] = name
+        elif self.action in ('retrieve', 'update', 'partial_update'):
+            lookups = {
+                name: name
+                for name in ('tags', 'ingredients', 'image_renditions')
+            }
+        else:
+            return queryset
+        return queryset.prefetch_related(*(
+            lookup for name, lookup in lookups.items()
+            if fields is None or name in fields
+        ))
+
+    def get_serializer_context(self):
+        '''出力フィールドとネストする関連をserializerに渡す
+        '''
+        context = super().get_serializer_context()
+        if self.request is not None:
+            fields = self.get_requested_fields()
+            if fields is not None:
+                context['fields'] = fields
+            context['expand'] = sorted(self.get_expanded_fields())
+        return context
+
+    def use_values_serializer(self):
+        '''expand指定時はネストした関連を出力するため、通常のserializerを使う
+        '''
+        return super().use_values_serializer() and \
+            not self.get_expanded_fields()
 
     def get_serializer_class(self):
         '''指定レシピ取得時は、RecipeDetailSerializerを返す。
         '''
-        if self.action == 'retrieve':
+        if self.use_values_serializer():
+            return super().get_serializer_class()
+        elif self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
-            return serializers.RecipeImageSerializer
+            return serializers.RecipeImageUploadSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
@@ -92,23 +383,53 @@ class RecipeViewSet(viewsets.ModelViewSet):
         '''
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            throttle_classes=(ScopedSlidingWindowThrottle, ),
+            throttle_scope='recipe_image_upload')
     def upload_image(self, request, pk=None):
         '''レシピに画像をアップロードする
+
+        画像は一時保存してバックグラウンドで処理するため、処理の完了を待たずに
+        image_statusがpendingの状態で返す。アップロードの頻度はユーザ毎に
+        制限し、超過したリクエストは画像を読み込む前に拒否する。
         '''
         recipe = self.get_object()
-        serializer = self.get_serializer(
-            recipe,
-            data=request.data
-        )
+        serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            images.schedule_processing(
+                recipe,
+                serializer.validated_data['image']
+            )
             return Response(
-                serializer.data,
-                status=status.HTTP_200_OK
+                serializers.RecipeImageSerializer(
+                    recipe,
+                    context=self.get_serializer_context()
+                ).data,
+                status=status.HTTP_202_ACCEPTED
             )
         return Response(
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['GET'], detail=False, url_path='export',
+            url_name='export')
+    def export_recipes(self, request):
+        '''ユーザの全レシピをNDJSONまたはCSVでストリーミング出力する
+        '''
+        file_format = request.query_params.get('file_format', 'ndjson')
+        if file_format not in export.RENDERERS:
+            raise ValidationError(
+                f'file_format must be one of: '
+                f'{", ".join(export.RENDERERS)}.'
+            )
+
+        content_type, render = export.RENDERERS[file_format]
+        response = StreamingHttpResponse(
+            render(export.iter_recipe_rows(request.user)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{file_format}"'
+        return response
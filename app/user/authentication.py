@@ -0,0 +1,72 @@
+import copy
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import TTLCache
+
+
+TOKEN_CACHE_KEY = 'user-api:token:{key}'
+
+
+token_cache = TTLCache(
+    settings.TOKEN_AUTH_CACHE_SIZE,
+    settings.TOKEN_AUTH_CACHE_TIMEOUT
+)
+
+
+def get_shared_cache():
+    '''プロセス間で共有するキャッシュを返す。設定がない場合はNoneを返す
+    '''
+    alias = settings.TOKEN_AUTH_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def invalidate_token(key):
+    '''tokenのキャッシュを削除する
+    '''
+    token_cache.delete(key)
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        shared_cache.delete(TOKEN_CACHE_KEY.format(key=key))
+
+
+def get_token_authentication_class():
+    '''設定で指定されたtoken認証クラスを返す
+    '''
+    return import_string(settings.TOKEN_AUTHENTICATION_CLASS)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    '''token→ユーザの対応をキャッシュし、リクエスト毎のDBアクセスをなくす認証
+
+    tokenの削除、ユーザの更新(無効化、パスワード変更)時にキャッシュは
+    削除される。他プロセスのプロセス内キャッシュは有効期限まで残るため、
+    有効期限は短く設定すること。
+    '''
+
+    def authenticate_credentials(self, key):
+        '''キャッシュにあればそれを、なければDBから取得してキャッシュする
+        '''
+        shared_cache = get_shared_cache()
+        cached = token_cache.get(key)
+        if cached is None and shared_cache is not None:
+            cached = shared_cache.get(TOKEN_CACHE_KEY.format(key=key))
+            if cached is not None:
+                token_cache.set(key, cached)
+
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+            if shared_cache is not None:
+                shared_cache.set(
+                    TOKEN_CACHE_KEY.format(key=key),
+                    cached,
+                    settings.TOKEN_AUTH_CACHE_TIMEOUT
+                )
+
+        user, token = cached
+        return (copy.copy(user), token)
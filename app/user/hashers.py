@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    '''反復回数をPASSWORD_PBKDF2_ITERATIONSで設定するPBKDF2のhasher
+
+    反復回数を変更すると、各ユーザの次回ログイン時に新しい回数で
+    ハッシュし直される。
+    '''
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    '''コストをPASSWORD_ARGON2_*で設定するArgon2のhasher
+
+    argon2-cffiがインストールされている場合のみ使用できる。
+    '''
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
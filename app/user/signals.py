@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from user.authentication import invalidate_token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    '''token削除時にキャッシュを削除する
+    '''
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, **kwargs):
+    '''ユーザの更新(無効化、パスワード変更)時にtokenのキャッシュを削除する
+    '''
+    keys = Token.objects.filter(user_id=instance.pk).values_list(
+        'key',
+        flat=True
+    )
+    for key in keys:
+        invalidate_token(key)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+TOKEN_URL = reverse('user:token')
+PBKDF2_HASHERS = [
+    'user.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+
+class PasswordHasherTests(TestCase):
+    '''パスワードのhasherの設定とログイン時のハッシュし直しのテスト
+    '''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {
+            'email': 'test@gmail.com',
+            'password': 'testpassword',
+        }
+        self.user = get_user_model().objects.create_user(**self.payload)
+
+    def test_fast_hasher_in_tests(self):
+        '''テスト実行時は高速なhasherが使われること
+        '''
+        self.assertEqual(settings.PASSWORD_HASHER, 'md5')
+        self.assertEqual(identify_hasher(self.user.password).algorithm, 'md5')
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_HASHERS,
+                       PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_rehash_with_preferred_hasher_on_login(self):
+        '''ログイン時に優先するhasherでハッシュし直されること
+        '''
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(
+            self.user.password.startswith('pbkdf2_sha256$1000$')
+        )
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_HASHERS,
+                       PASSWORD_PBKDF2_ITERATIONS=2000)
+    def test_rehash_with_new_iterations_on_login(self):
+        '''反復回数の変更後、ログイン時に新しい回数でハッシュし直されること
+        '''
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            self.user.set_password(self.payload['password'])
+            self.user.save()
+        self.assertTrue(
+            self.user.password.startswith('pbkdf2_sha256$1000$')
+        )
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(
+            self.user.password.startswith('pbkdf2_sha256$2000$')
+        )
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_HASHERS,
+                       PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_no_rehash_on_failed_login(self):
+        '''ログインに失敗した場合はハッシュし直さないこと
+        '''
+        password = self.user.password
+        res = self.client.post(
+            TOKEN_URL,
+            dict(self.payload, password='wrong')
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, password)
@@ -1,28 +1,57 @@
-from rest_framework import generics, authentication, permissions
-from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core.instrumentation import SerializerTimingMixin
+from core.throttling import LoginEmailRateThrottle, \
+    ScopedSlidingWindowThrottle
+from user.authentication import get_token_authentication_class
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(SerializerTimingMixin, generics.CreateAPIView):
     '''ユーザ新規作成
+
+    認証(Basic認証のパスワードのハッシュ)は頻度制限より前に行われるため、
+    認証は行わない。
     '''
     serializer_class = UserSerializer
+    authentication_classes = ()
+    throttle_classes = (ScopedSlidingWindowThrottle, )
+    throttle_scope = 'user_create'
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(SerializerTimingMixin, generics.GenericAPIView):
     '''新規token生成view
+
+    認証(Basic認証のパスワードのハッシュ)は頻度制限より前に行われるため、
+    認証は行わない。
     '''
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    authentication_classes = ()
+    permission_classes = ()
+    throttle_classes = (ScopedSlidingWindowThrottle, LoginEmailRateThrottle)
+    throttle_scope = 'login'
+
+    def post(self, request, *args, **kwargs):
+        '''認証情報を検証し、ユーザのtokenを返す
+        '''
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, created = Token.objects.get_or_create(
+            user=serializer.validated_data['user']
+        )
+        return Response({'token': token.key})
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(SerializerTimingMixin,
+                     generics.RetrieveUpdateAPIView):
     '''ユーザ管理と認証
     '''
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication, )
+    authentication_classes = (get_token_authentication_class(), )
     permission_classes = (permissions.IsAuthenticated, )
 
     def get_object(self):